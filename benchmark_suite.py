@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+离线基准测试套件
+在本地HTTP服务器上回放产品页面 (可配置延迟和抖动)，按引擎和线程数测量
+吞吐量、单URL耗时分布、峰值内存和CPU，结果写入JSON便于比较不同版本
+"""
+
+import argparse
+import csv
+import html
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import psutil
+
+SCRAPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'optimized_multithreaded_scraper.py')
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples', 'sample_output.csv')
+
+# 线上已下架、返回404的产品
+NOT_FOUND_SLUGS = ['chloroform-d-dlm-7-10', 'methanol-d4-dlm-24-10']
+
+PRODUCT_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{page_title}</title></head>
+<body>
+<header><nav><a href="/">Cambridge Isotope Laboratories</a></nav></header>
+<main>
+<h1>{name}</h1>
+<img src="{image_url}" alt="{name}">
+<div class="Details_customHorizontal"><span class="Details_name">CAS Number Labeled</span><span>{cas_labeled}</span></div>
+<div class="Details_customHorizontal"><span class="Details_name">CAS Number Unlabeled</span><span>{cas_unlabeled}</span></div>
+<div class="Details_customHorizontal"><span class="Details_name">Molecular Weight</span><span>{molecular_weight}</span></div>
+<div class="Details_customHorizontal"><span class="Details_name">Chemical Formula</span><span>{formula}</span></div>
+<div class="Details_customHorizontal"><span class="Details_name">Chemical Purity</span><span>{chemical_purity}</span></div>
+<div class="Details_customVertical"><span class="Details_name">Synonyms</span><span>{synonyms}</span></div>
+</main>
+</body></html>
+"""
+
+NOT_FOUND_PAGE = """<!DOCTYPE html>
+<html><head><title>Page Not Found - Cambridge Isotope Laboratories</title></head>
+<body><h1>Page Not Found</h1></body></html>
+"""
+
+
+def load_sample_products(csv_path=SAMPLE_CSV):
+    """读取示例输出中的真实产品数据，用于生成页面"""
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def build_synthetic_pages(count, not_found_ratio=0.1):
+    """按示例产品生成 count 个页面 {路径: (状态码, HTML)}，其中一部分为404"""
+    products = load_sample_products()
+    pages = {}
+    for i in range(count):
+        if not_found_ratio and i % max(1, round(1 / not_found_ratio)) == 0:
+            slug = NOT_FOUND_SLUGS[(i // 10) % len(NOT_FOUND_SLUGS)]
+            pages[f'/{slug}-v{i}'] = (404, NOT_FOUND_PAGE)
+            continue
+        product = products[i % len(products)]
+        slug = product['url'].rstrip('/').rsplit('/', 1)[-1]
+        fields = {key: html.escape(value or '') for key, value in product.items()}
+        pages[f'/{slug}-v{i}'] = (200, PRODUCT_PAGE_TEMPLATE.format(**fields))
+    return pages
+
+
+def load_recorded_pages(pages_dir):
+    """读取目录中保存的HTML页面，文件名 (不含扩展名) 作为URL路径"""
+    pages = {}
+    for name in sorted(os.listdir(pages_dir)):
+        if not name.endswith(('.html', '.htm')):
+            continue
+        with open(os.path.join(pages_dir, name), 'r', encoding='utf-8', errors='replace') as f:
+            page_html = f.read()
+        slug = os.path.splitext(name)[0]
+        not_found = any(s in slug for s in NOT_FOUND_SLUGS) or 'page not found' in page_html[:2000].lower()
+        pages[f'/{slug}'] = (404 if not_found else 200, page_html)
+    return pages
+
+
+class LocalCatalogServer:
+    """在本地端口回放页面，每个请求按 延迟±抖动 毫秒休眠后响应"""
+
+    def __init__(self, pages, latency_ms=50, jitter_ms=20):
+        self.pages = pages
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def respond(self, with_body):
+                with server.lock:
+                    server.requests += 1
+                delay = server.latency_ms + random.uniform(-server.jitter_ms, server.jitter_ms)
+                time.sleep(max(0.0, delay) / 1000)
+                status, page_html = server.pages.get(self.path.split('?', 1)[0], (404, NOT_FOUND_PAGE))
+                body = page_html.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if with_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self.respond(True)
+
+            def do_HEAD(self):
+                self.respond(False)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def urls(self):
+        return [self.base_url + path for path in self.pages]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ProcessTreeMonitor:
+    """后台采样进程树 (爬虫 + chromedriver/Chrome子进程) 的RSS与CPU时间"""
+
+    def __init__(self, pid, interval=0.1):
+        self.root = psutil.Process(pid)
+        self.interval = interval
+        self.peak_rss = 0
+        self.cpu_seconds = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        try:
+            processes = [self.root] + self.root.children(recursive=True)
+        except psutil.Error:
+            return
+        rss = 0
+        for process in processes:
+            try:
+                rss += process.memory_info().rss
+                times = process.cpu_times()
+                # 已退出的子进程保留最后一次采样的CPU时间
+                self.cpu_seconds[process.pid] = times.user + times.system
+            except psutil.Error:
+                continue
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.sample()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.sample()
+        self.stopped.set()
+        self.thread.join()
+        return {'peak_rss_mb': round(self.peak_rss / (1024 ** 2), 1),
+                'cpu_seconds': round(sum(self.cpu_seconds.values()), 2)}
+
+
+def run_scraper(engine, workers, urls_file, workdir, args):
+    """运行一次爬虫子进程，返回测量结果"""
+    prefix = os.path.join(workdir, f'bench_{engine}_{workers}t')
+    metrics_path = f'{prefix}_metrics.json'
+    cmd = [sys.executable, SCRAPER,
+           '-t', str(workers),
+           '--engine', engine,
+           '--headless',
+           '-u', urls_file,
+           '-o', prefix,
+           '--no-excel',
+           '--no-dedup',  # 合成页面的 -vN 变体共用产品编号，去重后实际抓取数会少于URL数
+           '--metrics-json', metrics_path,
+           '--rate', str(args.rate),
+           '--max-per-host', str(args.max_per_host),
+           '--concurrency', str(args.concurrency),
+           '--journal', f'{prefix}.journal.jsonl']
+
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, cwd=workdir, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    monitor = ProcessTreeMonitor(process.pid)
+    try:
+        _, stderr = process.communicate(timeout=args.timeout)
+        timed_out = False
+    except subprocess.TimeoutExpired:
+        process.kill()
+        _, stderr = process.communicate()
+        timed_out = True
+    wall = time.perf_counter() - start
+    resources = monitor.stop()
+
+    result = {
+        'engine': engine,
+        'workers': workers,
+        'returncode': process.returncode,
+        'timed_out': timed_out,
+        'wall_seconds': round(wall, 3),
+        **resources,
+        'cpu_percent': round(resources['cpu_seconds'] / wall * 100, 1) if wall else 0.0,
+    }
+
+    if os.path.exists(metrics_path):
+        with open(metrics_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        processed = report['products'] + report['skipped'] + report['failed']
+        result.update({
+            'products': report['products'],
+            'skipped': report['skipped'],
+            'failed': report['failed'],
+            'urls_per_second': round(processed / wall, 3) if wall else 0.0,
+            'products_per_second': round(report['products'] / wall, 3) if wall else 0.0,
+            'latency': report['stages'].get('url_total', {}),
+            'stages': report['stages'],
+        })
+    else:
+        result['error'] = (stderr or '').strip()[-500:]
+    return result
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='离线基准测试：本地回放产品页面，比较各引擎和线程数的性能')
+
+    parser.add_argument('--engines', type=str, default='static,async',
+                       help='要测试的引擎，逗号分隔: selenium,static,async (默认: static,async)')
+
+    parser.add_argument('--workers', type=str, default='1,2,4,8',
+                       help='要测试的线程数，逗号分隔，不超过64 (默认: 1,2,4,8)')
+
+    parser.add_argument('--pages', type=str, default=None,
+                       help='保存的HTML页面目录 (默认: 根据examples/sample_output.csv生成页面)')
+
+    parser.add_argument('--count', type=int, default=200,
+                       help='未指定 --pages 时生成的页面数，其中约10%%为404 (默认: 200)')
+
+    parser.add_argument('--latency', type=float, default=50,
+                       help='本地服务器每个请求的延迟毫秒数 (默认: 50)')
+
+    parser.add_argument('--jitter', type=float, default=20,
+                       help='延迟的随机抖动毫秒数 (默认: 20)')
+
+    parser.add_argument('--repeat', type=int, default=1,
+                       help='每个配置重复运行的次数 (默认: 1)')
+
+    parser.add_argument('--rate', type=float, default=1000,
+                       help='传给爬虫的每主机请求速率，本地测试默认不限速 (默认: 1000)')
+
+    parser.add_argument('--max-per-host', type=int, default=256,
+                       help='传给爬虫的每主机并发上限 (默认: 256)')
+
+    parser.add_argument('--concurrency', type=int, default=100,
+                       help='async引擎的并发请求数 (默认: 100)')
+
+    parser.add_argument('--timeout', type=int, default=600,
+                       help='单次运行的超时秒数 (默认: 600)')
+
+    parser.add_argument('-o', '--output', type=str, default=None,
+                       help='结果JSON路径 (默认: benchmark_results_<时间戳>.json)')
+
+    parser.add_argument('--keep-output', action='store_true',
+                       help='保留每次运行的CSV和指标文件')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+    worker_counts = [int(value) for value in args.workers.split(',') if value.strip()]
+    output = args.output or f'benchmark_results_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+
+    pages = load_recorded_pages(args.pages) if args.pages else build_synthetic_pages(args.count)
+    server = LocalCatalogServer(pages, latency_ms=args.latency, jitter_ms=args.jitter)
+    workdir = tempfile.mkdtemp(prefix='scraper_bench_')
+    urls_file = os.path.join(workdir, 'urls.json')
+    with open(urls_file, 'w', encoding='utf-8') as f:
+        json.dump(server.urls(), f)
+
+    print("=== Cambridge Isotope Laboratories 离线基准测试 ===\n")
+    print(f"页面数: {len(pages)} (404: {sum(1 for status, _ in pages.values() if status == 404)})")
+    print(f"本地服务器: {server.base_url}, 延迟 {args.latency}±{args.jitter}ms")
+    print(f"CPU核心数: {psutil.cpu_count()}, 总内存: {psutil.virtual_memory().total / (1024**3):.1f} GB\n")
+
+    runs = []
+    try:
+        for engine in engines:
+            for workers in worker_counts:
+                for attempt in range(args.repeat):
+                    print(f"🧪 {engine} 引擎, {workers} 线程 (第 {attempt + 1}/{args.repeat} 次)")
+                    result = run_scraper(engine, workers, urls_file, workdir, args)
+                    result['repeat'] = attempt + 1
+                    runs.append(result)
+                    if 'latency' in result:
+                        latency = result['latency']
+                        print(f"   耗时 {result['wall_seconds']:.1f}s, {result['urls_per_second']:.1f} URL/秒, "
+                              f"p50 {latency.get('p50', 0):.3f}s, p95 {latency.get('p95', 0):.3f}s, "
+                              f"峰值内存 {result['peak_rss_mb']:.0f}MB, CPU {result['cpu_percent']:.0f}%")
+                    else:
+                        print(f"   ❌ 运行失败 (返回码 {result['returncode']}): {result['error'][-200:]}")
+    finally:
+        server.close()
+        if args.keep_output:
+            print(f"\n运行输出保留在: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'host': {
+            'cpu_count': psutil.cpu_count(),
+            'memory_gb': round(psutil.virtual_memory().total / (1024 ** 3), 1),
+            'python': sys.version.split()[0],
+        },
+        'config': {
+            'pages': len(pages),
+            'source': args.pages or 'synthetic',
+            'latency_ms': args.latency,
+            'jitter_ms': args.jitter,
+            'rate': args.rate,
+            'max_per_host': args.max_per_host,
+            'concurrency': args.concurrency,
+        },
+        'server_requests': server.requests,
+        'runs': runs,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print("\n=== 测试报告 ===")
+    print(f"{'引擎':<10} {'线程数':<8} {'耗时(秒)':<10} {'URL/秒':<10} {'p95(秒)':<10} {'峰值内存':<10}")
+    print("-" * 64)
+    for result in runs:
+        if 'latency' in result:
+            print(f"{result['engine']:<10} {result['workers']:<8} {result['wall_seconds']:<10.1f} "
+                  f"{result['urls_per_second']:<10.1f} {result['latency'].get('p95', 0):<10.3f} "
+                  f"{result['peak_rss_mb']:.0f}MB")
+        else:
+            print(f"{result['engine']:<10} {result['workers']:<8} 失败")
+    print(f"\n📁 结果已保存: {output}")
+
+    return 0 if all('latency' in result for result in runs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
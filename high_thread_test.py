@@ -8,6 +8,7 @@ import subprocess
 import time
 import psutil
 import os
+import json
 from datetime import datetime
 
 def monitor_system_resources():
@@ -22,6 +23,28 @@ def monitor_system_resources():
         'available_memory_gb': memory.available / (1024**3)
     }
 
+def run_autotune_test(max_threads=16, products=20):
+    """以 --autotune 运行一次，返回指标报告中的自动调节结果"""
+    metrics_path = 'test_autotune_metrics.json'
+    print(f"🧪 自动调节测试: 上限 {max_threads} 线程, {products} 个产品")
+    cmd = [
+        'python', 'optimized_multithreaded_scraper.py',
+        '-t', str(max_threads),
+        '--headless',
+        '-n', str(products),
+        '--autotune',
+        '--autotune-interval', '5',
+        '--metrics-json', metrics_path,
+        '-o', 'test_autotune'
+    ]
+    try:
+        subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        with open(metrics_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('autotune')
+    except Exception as e:
+        print(f"   💥 自动调节测试失败: {e}")
+        return None
+
 def test_thread_performance():
     """测试不同线程数的性能"""
     
@@ -185,6 +208,11 @@ def test_thread_performance():
             best_stable = max(stable_configs, key=lambda x: x['threads'])
             print(f"🛡️  最稳定配置: {best_stable['threads']} 线程 (内存增量: {best_stable['memory_peak']:.1f}GB)")
     
+    # 自动调节：由爬虫在运行中根据吞吐量、错误率和内存确定worker数
+    autotune = run_autotune_test()
+    if autotune:
+        print(f"🤖 自动调节: 最终 {autotune['limit']} 个worker (峰值 {autotune['peak']}, 调整 {autotune['adjustments']} 次)")
+
     print(f"\n💡 建议:")
     print(f"   - 日常使用: 2-4 线程")
     print(f"   - 批量处理: 4-8 线程")
@@ -4,35 +4,2186 @@
 改进了数据提取和404页面处理
 """
 
+import os
+import sys
 import time
+import zlib
+import subprocess
+import asyncio
 import json
 import re
 import csv
 import random
 import threading
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import queue
+import heapq
+import html
+import math
+import gzip
+import string
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import pandas as pd
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from datetime import datetime
+from collections import deque
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import logging
+import hashlib
+import socket
+import sqlite3
 import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
+from lxml import html as lxml_html
+from lxml import etree
+from openpyxl import Workbook
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+PRODUCT_FIELDS = [
+    'url', 'name', 'product_number', 'cas_labeled', 'cas_unlabeled', 'synonyms',
+    'formula', 'molecular_weight', 'isotopic_enrichment', 'chemical_purity',
+    'description', 'image_url', 'page_title', 'content_hash',
+]
+
+NAME_XPATHS = [
+    '//h1',
+    '//*[contains(concat(" ", normalize-space(@class), " "), " product-title ")]',
+    '//*[contains(concat(" ", normalize-space(@class), " "), " product-name ")]',
+    '//*[contains(concat(" ", normalize-space(@class), " "), " page-title ")]',
+    '//*[contains(concat(" ", normalize-space(@class), " "), " entry-title ")]',
+    '//*[@data-testid="product-name"]',
+]
+
+DETAIL_XPATH = (
+    '//*[contains(concat(" ", normalize-space(@class), " "), " Details_customHorizontal ")'
+    ' or contains(concat(" ", normalize-space(@class), " "), " Details_customVertical ")]'
+)
+
+
+def new_product_info(url, page_title=''):
+    """创建空的产品信息记录"""
+    product_info = {field: '' for field in PRODUCT_FIELDS}
+    product_info['url'] = url
+    product_info['page_title'] = page_title
+    return product_info
+
+
+def is_not_found_title(title):
+    """根据页面标题判断是否为404页面"""
+    title = (title or '').lower()
+    return 'not found' in title or 'page cannot be found' in title
+
+
+PRODUCT_NUMBER_PATTERNS = [
+    # 完整前缀 (CLM/DLM/CDLM/CNLM/DNLM/CDNLM...)，不能从 cdlm 中截出 dlm
+    re.compile(r'(?<![a-z])([a-z]{1,5}lm-\d+(?:-[a-z0-9]+)?)', re.IGNORECASE),
+    re.compile(r'itemno=([A-Z0-9-]+)', re.IGNORECASE),
+]
+
+TITLE_NAME_RE = re.compile(r'^([^-]+)')
+
+# 包装后缀：l-alanine-...-clm-116-pk 与 clm-116 是同一个SKU
+PACK_SUFFIX_RE = re.compile(r'-PK$', re.IGNORECASE)
+
+# 规范化URL时丢弃的跟踪参数
+TRACKING_PARAMS = ('utm_', 'gclid', 'fbclid', 'ref')
+
+# 页面源码中的详情行 (>标签</span><span>值</span>)：在小写副本上用 str.find 定位标签关键词，
+# 只在命中处匹配值；忽略大小写的正则无法按字面量快速跳过，大页面上要慢得多
+SPAN_CLOSE = '</span>'
+DETAIL_LABEL_MAX = 80
+DETAIL_LABEL_KEYWORDS = ('cas number', 'formula', 'synonyms', 'molecular weight', 'enrichment', 'purity')
+DETAIL_VALUE_RE = re.compile(r'\s*<span[^>]*>((?:[^<]|<(?!/span>))*)</span>', re.IGNORECASE)
+
+# 纯文本形式的CAS号 (在小写副本上匹配) 和分子式，只在详情行缺少对应字段时扫描
+TEXT_CAS_RE = re.compile(r'cas\s*number\s*(un)?labeled[:\s]*(\d{1,7}-\d{2}-\d)')
+TEXT_FORMULA_VALUE_RE = re.compile(r'[:\s]*([A-Z][a-z]?(?:\d+)?(?:[A-Z*][a-z]?(?:\d+)?)*)', re.IGNORECASE)
+
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+TAG_RE = re.compile(r'<[^>]+>')
+
+
+def extract_product_number(url):
+    """从URL提取产品编号"""
+    for pattern in PRODUCT_NUMBER_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return match.group(1).upper()
+
+    return ''
+
+
+def canonical_product_number(url):
+    """规范产品编号：大写并去掉包装后缀 -PK"""
+    return PACK_SUFFIX_RE.sub('', extract_product_number(url))
+
+
+def normalize_url(url):
+    """规范URL：小写协议和主机，去掉分类前缀、片段、跟踪参数和结尾斜杠"""
+    parsed = urlparse(url.strip())
+    slug = parsed.path.rstrip('/').rsplit('/', 1)[-1]
+    query = sorted((key, value) for key, value in parse_qsl(parsed.query)
+                   if not key.lower().startswith(TRACKING_PARAMS))
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), '/' + slug, '', urlencode(query), ''))
+
+
+def canonical_key(url):
+    """去重键：能识别产品编号时按编号，否则按规范URL"""
+    number = canonical_product_number(url)
+    return f'product:{number}' if number else f'url:{normalize_url(url)}'
+
+
+def alias_product(product_info, alias_url):
+    """把主URL的提取结果复制给别名URL"""
+    product = dict(product_info, url=alias_url)
+    product['product_number'] = extract_product_number(alias_url) or product_info['product_number']
+    return product
+
+
+def detail_field_for_label(label):
+    """把详情标签映射到产品字段名，未知标签返回None"""
+    label = label.strip().lower()
+    if 'cas number labeled' in label:
+        return 'cas_labeled'
+    if 'cas number unlabeled' in label:
+        return 'cas_unlabeled'
+    if 'formula' in label:
+        return 'formula'
+    if 'synonyms' in label:
+        return 'synonyms'
+    if 'molecular weight' in label:
+        return 'molecular_weight'
+    if 'enrichment' in label:
+        return 'isotopic_enrichment'
+    if 'purity' in label:
+        return 'chemical_purity'
+    return None
+
+
+def apply_detail_field(product_info, name, value):
+    """把一行详情(标签, 值)写入产品信息，返回是否命中已知字段"""
+    field = detail_field_for_label(name)
+    if field is None:
+        return False
+    if field != 'synonyms' or not product_info['synonyms']:
+        product_info[field] = value
+    return True
+
+
+def lower_same_length(text):
+    """小写副本，保证与原文逐字符对齐 (个别非ASCII字符小写后会变长，此时只转换ASCII)"""
+    lowered = text.lower()
+    return lowered if len(lowered) == len(text) else text.translate(ASCII_LOWER)
+
+
+def parse_source_details(page_source):
+    """扫描页面源码，返回 {字段: 值}；详情行优先于纯文本匹配，同一字段取第一次出现的值"""
+    page_source = page_source or ''
+    lowered = lower_same_length(page_source)
+    rows = {}
+    label_ends = set()
+    for keyword in DETAIL_LABEL_KEYWORDS:
+        pos = lowered.find(keyword)
+        while pos != -1:
+            end = lowered.find(SPAN_CLOSE, pos, pos + DETAIL_LABEL_MAX + len(SPAN_CLOSE))
+            start = lowered.rfind('>', max(0, end - DETAIL_LABEL_MAX - 1), end) if end != -1 else -1
+            # 关键词必须位于这个 </span> 的标签文本内，正文中附近的同名词不会占用真正的标签
+            if start != -1 and start < pos and end not in label_ends:
+                label = page_source[start + 1:end]
+                field = detail_field_for_label(label) if '<' not in label else None
+                match = DETAIL_VALUE_RE.match(page_source, end + len(SPAN_CLOSE)) if field else None
+                if match:
+                    label_ends.add(end)
+                    value = ' '.join(html.unescape(TAG_RE.sub('', match.group(1))).split())
+                    if value and (field not in rows or start < rows[field][0]):
+                        rows[field] = (start, value)
+            pos = lowered.find(keyword, pos + len(keyword))
+
+    fields = {}
+    if 'cas_labeled' not in rows or 'cas_unlabeled' not in rows:
+        for match in TEXT_CAS_RE.finditer(lowered):
+            fields.setdefault('cas_unlabeled' if match.group(1) else 'cas_labeled', match.group(2))
+    if 'formula' not in rows:
+        pos = lowered.find('formula')
+        while pos != -1:
+            match = TEXT_FORMULA_VALUE_RE.match(page_source, pos + len('formula'))
+            if match:
+                fields['formula'] = match.group(1)
+                break
+            pos = lowered.find('formula', pos + 1)
+    fields.update({field: value for field, (_, value) in rows.items()})
+    return fields
+
+
+def fill_missing_fields(product_info, fields):
+    """只填充产品信息中仍为空的字段"""
+    for field, value in fields.items():
+        if not product_info.get(field):
+            product_info[field] = value
+
+
+def pick_product_name(candidates, title):
+    """从候选文本和页面标题中挑选产品名称"""
+    for text in candidates:
+        text = text.strip()
+        if text and len(text) > 3 and 'Cambridge Isotope' not in text and 'not found' not in text.lower():
+            return text
+
+    # 从页面标题提取
+    if title and 'Cambridge Isotope' in title and 'not found' not in title.lower():
+        name_match = TITLE_NAME_RE.search(title)
+        if name_match:
+            name = name_match.group(1).strip()
+            if len(name) > 3:
+                return name
+
+    return ''
+
+
+def pick_image_url(srcs, base_url='https://isotope.com'):
+    """从图片地址中挑选产品图片"""
+    for src in srcs:
+        if src and '/product/image/' in src:
+            return urljoin(base_url, src)
+    return ''
+
+
+def _element_text(element):
+    return ' '.join(element.text_content().split())
+
+
+def content_hash_from_parts(headings, detail_blocks, image_srcs):
+    """计算产品详情区域 (标题、详情块文本、产品图片) 的内容哈希"""
+    parts = list(headings) + list(detail_blocks)
+    parts.extend(src for src in image_srcs if src and '/product/image/' in src)
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def detail_region_hash(tree):
+    """从lxml文档树计算详情区域哈希"""
+    return content_hash_from_parts(
+        [_element_text(element) for element in tree.xpath('//h1')],
+        [_element_text(element) for element in tree.xpath(DETAIL_XPATH)],
+        tree.xpath('//img/@src'),
+    )
+
+
+def page_content_hash(page_html):
+    """从页面HTML计算详情区域哈希"""
+    return detail_region_hash(lxml_html.fromstring(page_html))
+
+
+def find_previous_results(output_prefix, exclude=None, since=None):
+    """查找同一输出前缀下最近一次的结果CSV；指定since (%Y%m%d_%H%M%S) 时只接受此后开始的运行"""
+    directory = os.path.dirname(output_prefix) or '.'
+    pattern = re.compile(re.escape(os.path.basename(output_prefix)) + r'_(\d{8}_\d{6})\.csv$')
+    candidates = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if pattern.match(name) and (not since or pattern.match(name).group(1) >= since)
+    )
+    candidates = [path for path in candidates if not exclude or os.path.abspath(path) != os.path.abspath(exclude)]
+    return candidates[-1] if candidates else None
+
+
+def parse_product_html(page_html, url):
+    """用lxml从静态HTML解析产品信息，404页面返回None"""
+    tree = lxml_html.fromstring(page_html)
+    title = ' '.join(tree.findtext('.//title', default='').split())
+    if is_not_found_title(title):
+        return None
+
+    product_info = new_product_info(url, title)
+    product_info['product_number'] = extract_product_number(url)
+    product_info['content_hash'] = detail_region_hash(tree)
+
+    candidates = []
+    for xpath in NAME_XPATHS:
+        candidates.extend(_element_text(element) for element in tree.xpath(xpath))
+    product_info['name'] = pick_product_name(candidates, title)
+    product_info['image_url'] = pick_image_url(tree.xpath('//img/@src'), url)
+
+    for element in tree.xpath(DETAIL_XPATH):
+        name_elements = element.xpath('.//*[contains(concat(" ", normalize-space(@class), " "), " Details_name ")]')
+        spans = element.xpath('.//span')
+        if name_elements and len(spans) >= 2:
+            apply_detail_field(product_info, _element_text(name_elements[0]), _element_text(spans[1]))
+
+    # 详情块缺失时与浏览器路径一样回退到源码扫描
+    if not has_core_fields(product_info):
+        fill_missing_fields(product_info, parse_source_details(page_html))
+
+    return product_info
+
+
+# 一次execute_script往返取回提取所需的全部页面数据
+EXTRACT_PAGE_JS = """
+    function clean(text) { return (text || '').replace(/\\s+/g, ' ').trim(); }
+    var snapshot = {title: document.title, url: location.href, names: [], headings: [],
+                    details: [], detail_blocks: [], images: []};
+    arguments[0].forEach(function(selector) {
+        document.querySelectorAll(selector).forEach(function(el) { snapshot.names.push(el.innerText || ''); });
+    });
+    document.querySelectorAll('h1').forEach(function(el) { snapshot.headings.push(clean(el.textContent)); });
+    ['.Details_customHorizontal', '.Details_customVertical'].forEach(function(selector) {
+        document.querySelectorAll(selector).forEach(function(el) {
+            var label = el.querySelector('.Details_name');
+            var spans = el.querySelectorAll('span');
+            if (label && spans.length >= 2) {
+                snapshot.details.push([label.innerText || '', spans[1].innerText || '']);
+            }
+        });
+    });
+    document.querySelectorAll('.Details_customHorizontal, .Details_customVertical').forEach(function(el) {
+        snapshot.detail_blocks.push(clean(el.textContent));
+    });
+    document.querySelectorAll('img').forEach(function(el) { snapshot.images.push(el.getAttribute('src') || ''); });
+    return snapshot;
+"""
+
+NAME_SELECTORS = [
+    'h1',
+    '.product-title',
+    '.product-name',
+    '.page-title',
+    '.entry-title',
+    '[data-testid="product-name"]',
+]
+
+
+def has_core_fields(product_info):
+    """静态解析结果是否包含关键字段"""
+    return bool(product_info['cas_labeled'] or product_info['cas_unlabeled'] or product_info['formula'])
+
+
+def has_product_data(product_info):
+    """提取结果是否有数据 (名称、CAS或分子式之一)，空结果不算成功"""
+    return bool(product_info['name'] or product_info['cas_labeled'] or product_info['formula'])
+
+
+def snapshot_from_html(page_html, url):
+    """用lxml从HTML生成与 EXTRACT_PAGE_JS 相同结构的页面快照"""
+    tree = lxml_html.fromstring(page_html or '<html></html>')
+    snapshot = {
+        'title': ' '.join(tree.findtext('.//title', default='').split()),
+        'url': url,
+        'names': [],
+        'headings': [_element_text(element) for element in tree.xpath('//h1')],
+        'details': [],
+        'detail_blocks': [],
+        'images': [src or '' for src in tree.xpath('//img/@src')],
+    }
+    for xpath in NAME_XPATHS:
+        snapshot['names'].extend(element.text_content() for element in tree.xpath(xpath))
+    for element in tree.xpath(DETAIL_XPATH):
+        name_elements = element.xpath('.//*[contains(concat(" ", normalize-space(@class), " "), " Details_name ")]')
+        spans = element.xpath('.//span')
+        if name_elements and len(spans) >= 2:
+            snapshot['details'].append([name_elements[0].text_content(), spans[1].text_content()])
+        snapshot['detail_blocks'].append(_element_text(element))
+    return snapshot
+
+
+class HttpCache:
+    """磁盘HTTP缓存：保存响应体和验证器 (ETag/Last-Modified)，按TTL复用、过期后条件请求"""
+
+    CACHEABLE_STATUS = (200, 301, 308, 404, 410)
+
+    def __init__(self, directory, ttl=3600, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _paths(self, method, url):
+        key = hashlib.sha1(f'{method.upper()} {url}'.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body'
+
+    def lookup(self, method, url):
+        """返回缓存条目 (元数据字典)，不存在时返回None"""
+        meta_path, _ = self._paths(method, url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry['stored_at'] < self.ttl
+
+    def has_fresh(self, method, url):
+        return self.is_fresh(self.lookup(method, url))
+
+    def read_body(self, method, url):
+        _, body_path = self._paths(method, url)
+        try:
+            with open(body_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return b''
+
+    @staticmethod
+    def conditional_headers(entry):
+        """根据缓存的验证器生成条件请求头"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def _write(self, path, data, mode):
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            f.write(data)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        return len(data.encode('utf-8') if isinstance(data, str) else data) - old_size
+
+    def store(self, method, url, status, headers, body):
+        """保存响应及其验证器"""
+        meta_path, body_path = self._paths(method, url)
+        headers = dict(headers)
+        entry = {
+            'url': url,
+            'status': status,
+            'headers': headers,
+            'etag': headers.get('ETag') or headers.get('etag'),
+            'last_modified': headers.get('Last-Modified') or headers.get('last-modified'),
+            'stored_at': time.time(),
+        }
+        delta = self._write(body_path, body, 'wb')
+        delta += self._write(meta_path, json.dumps(entry, ensure_ascii=False), 'w')
+        with self.lock:
+            self.total_bytes += delta
+            over_limit = self.total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def refresh(self, method, url, entry):
+        """收到304后刷新缓存时间"""
+        meta_path, _ = self._paths(method, url)
+        entry['stored_at'] = time.time()
+        self._write(meta_path, json.dumps(entry, ensure_ascii=False), 'w')
+
+    def evict(self):
+        """按存储时间淘汰最旧的条目，直到总大小降到上限的90%"""
+        with self.lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith('.json'):
+                    files.append((entry.stat().st_mtime, entry.path))
+            files.sort()
+            target = self.max_bytes * 0.9
+            for _, meta_path in files:
+                if self.total_bytes <= target:
+                    break
+                for path in (meta_path, meta_path[:-len('.json')] + '.body'):
+                    try:
+                        self.total_bytes -= os.path.getsize(path)
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def count(self, kind):
+        with self.lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+
+    def summary(self):
+        return (f"命中 {self.hits}, 304重新验证 {self.revalidated}, 未命中 {self.misses}, "
+                f"占用 {self.total_bytes / (1024 * 1024):.1f}MB")
+
+
+class CachingHTTPAdapter(HTTPAdapter):
+    """在requests传输层接入HttpCache的适配器"""
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def build_cached_response(self, request, entry, body):
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.reason = 'Cached'
+        response.connection = self
+        response.from_cache = True
+        return response
+
+    def send(self, request, **kwargs):
+        method = request.method.upper()
+        if method not in ('GET', 'HEAD'):
+            return super().send(request, **kwargs)
+
+        entry = self.cache.lookup(method, request.url)
+        if self.cache.is_fresh(entry):
+            self.cache.count('hits')
+            return self.build_cached_response(request, entry, self.cache.read_body(method, request.url))
+        if entry:
+            request.headers.update(self.cache.conditional_headers(entry))
+
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and entry:
+            self.cache.count('revalidated')
+            self.cache.refresh(method, request.url, entry)
+            response.close()
+            return self.build_cached_response(request, entry, self.cache.read_body(method, request.url))
+
+        self.cache.count('misses')
+        if response.status_code in HttpCache.CACHEABLE_STATUS:
+            body = response.content if method == 'GET' else b''
+            self.cache.store(method, request.url, response.status_code, response.headers, body)
+        return response
+
+
+class PageStore:
+    """页面存档：每个URL保存最终HTML和元数据 (状态码、响应头、来源)，用于录制与回放"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.saved = 0
+        self.loaded = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.html'
+
+    def save(self, url, status, page_html, headers=None, final_url=None, source='http'):
+        """写入页面 (先写临时文件再替换，中断时不会留下半个文件)"""
+        meta_path, html_path = self._paths(url)
+        meta = {
+            'url': url,
+            'final_url': final_url or url,
+            'status': status,
+            'headers': dict(headers or {}),
+            'source': source,
+            'fetched_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        for path, content in ((html_path, page_html or ''), (meta_path, json.dumps(meta, ensure_ascii=False))):
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        with self.lock:
+            self.saved += 1
+
+    def load_meta(self, url):
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, url):
+        """返回 (元数据, HTML)，未录制时抛出KeyError"""
+        meta = self.load_meta(url)
+        if meta is None:
+            raise KeyError(f"页面未录制: {url}")
+        _, html_path = self._paths(url)
+        with open(html_path, 'r', encoding='utf-8') as f:
+            page_html = f.read()
+        with self.lock:
+            self.loaded += 1
+        return meta, page_html
+
+    def urls(self):
+        """存档中的全部URL"""
+        urls = []
+        for entry in sorted(os.scandir(self.directory), key=lambda e: e.name):
+            if entry.name.endswith('.json'):
+                try:
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        urls.append(json.load(f)['url'])
+                except (OSError, ValueError, KeyError):
+                    continue
+        return urls
+
+    def summary(self):
+        return {'saved': self.saved, 'loaded': self.loaded}
+
+
+class HostRateLimiter:
+    """按主机的令牌桶限速和并发上限，遇到429/503或慢响应时自适应退避"""
+
+    def __init__(self, rate=2.0, max_in_flight=8, burst=None, slow_threshold=10.0, min_rate=0.05):
+        self.base_rate = rate
+        self.max_in_flight = max_in_flight
+        self.burst = burst or max(1.0, rate)
+        self.slow_threshold = slow_threshold
+        self.min_rate = min_rate
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.backoffs = 0
+
+    def _host(self, url):
+        host = urlparse(url).netloc.lower()
+        state = self.hosts.get(host)
+        if state is None:
+            state = {
+                'rate': self.base_rate,
+                'tokens': self.burst,
+                'updated': time.monotonic(),
+                'blocked_until': 0.0,
+                'slots': threading.BoundedSemaphore(self.max_in_flight),
+            }
+            self.hosts[host] = state
+        return state
+
+    def reserve(self, url):
+        """预订一个令牌，返回需要等待的秒数 (不占用并发名额)"""
+        with self.lock:
+            state = self._host(url)
+            now = time.monotonic()
+            state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * state['rate'])
+            state['updated'] = now
+            state['tokens'] -= 1
+            wait = 0.0 if state['tokens'] >= 0 else -state['tokens'] / state['rate']
+            return max(wait, state['blocked_until'] - now)
+
+    def acquire(self, url):
+        """占用主机并发名额并等待令牌"""
+        with self.lock:
+            slots = self._host(url)['slots']
+        slots.acquire()
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self, url, status=None, elapsed=None, retry_after=None):
+        """释放并发名额并根据响应调整速率"""
+        with self.lock:
+            slots = self._host(url)['slots']
+        slots.release()
+        self.feedback(url, status, elapsed, retry_after)
+
+    def feedback(self, url, status=None, elapsed=None, retry_after=None):
+        """根据响应状态和耗时调整主机速率 (乘性减小, 加性恢复)"""
+        with self.lock:
+            state = self._host(url)
+            if status in (429, 503):
+                state['rate'] = max(self.min_rate, state['rate'] / 2)
+                pause = retry_after if retry_after is not None else 1.0 / state['rate']
+                state['blocked_until'] = max(state['blocked_until'], time.monotonic() + pause)
+                self.backoffs += 1
+                logger.warning(f"收到 {status}，{urlparse(url).netloc} 限速降至 {state['rate']:.2f} 请求/秒，暂停 {pause:.1f}s")
+            elif elapsed is not None and elapsed > self.slow_threshold:
+                state['rate'] = max(self.min_rate, state['rate'] * 0.75)
+                self.backoffs += 1
+                logger.info(f"响应较慢 ({elapsed:.1f}s)，{urlparse(url).netloc} 限速降至 {state['rate']:.2f} 请求/秒")
+            elif state['rate'] < self.base_rate:
+                state['rate'] = min(self.base_rate, state['rate'] + self.base_rate * 0.05)
+
+    @staticmethod
+    def parse_retry_after(value):
+        """解析Retry-After头 (仅支持秒数)"""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def summary(self):
+        with self.lock:
+            rates = {host: round(state['rate'], 2) for host, state in self.hosts.items()}
+        return f"当前速率 {rates} 请求/秒, 退避 {self.backoffs} 次"
+
+
+class ResourceBlocker:
+    """通过Chrome DevTools Protocol屏蔽不需要的资源请求，保留第一方页面和JS"""
+
+    CATEGORY_PATTERNS = {
+        'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico', '*.bmp'],
+        'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+        'media': ['*.mp4', '*.webm', '*.mp3', '*.ogg', '*.wav', '*.m4a', '*.mov'],
+        'analytics': [
+            '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+            '*facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*clarity.ms*',
+            '*linkedin.com/px*', '*bat.bing.com*', '*hs-scripts.com*', '*hs-analytics.net*',
+            '*nr-data.net*', '*newrelic.com*',
+        ],
+        'third_party': [
+            '*fonts.googleapis.com*', '*fonts.gstatic.com*', '*youtube.com*', '*vimeo.com*',
+            '*twitter.com*', '*addthis.com*', '*sharethis.com*', '*zendesk.com*', '*intercom.io*',
+        ],
+    }
+    DEFAULT_CATEGORIES = ['image', 'font', 'media', 'analytics', 'third_party']
+
+    def __init__(self, categories=None, extra_patterns=None):
+        categories = self.DEFAULT_CATEGORIES if categories is None else categories
+        unknown = [category for category in categories if category not in self.CATEGORY_PATTERNS]
+        if unknown:
+            raise ValueError(f"未知的屏蔽类别: {', '.join(unknown)}")
+        self.categories = list(categories)
+        self.patterns = []
+        for category in self.categories:
+            self.patterns.extend(self.CATEGORY_PATTERNS[category])
+        self.patterns.extend(extra_patterns or [])
+
+    @classmethod
+    def from_option(cls, value, extra_patterns=None):
+        """解析命令行的逗号分隔类别，'none' 表示不屏蔽"""
+        if value.strip().lower() == 'none':
+            categories = []
+        else:
+            categories = [item.strip() for item in value.split(',') if item.strip()]
+        return cls(categories, extra_patterns)
+
+    def apply(self, driver):
+        """在新建的浏览器会话上启用请求屏蔽 (图片的src属性仍保留在DOM中)"""
+        if not self.patterns:
+            return
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.patterns})
+
+
+class PageReadiness:
+    """基于页面信号的就绪检测，替代固定的sleep等待"""
+
+    SIGNALS_JS = """
+        if (!window.__cilReadiness) {
+            window.__cilReadiness = {last: performance.now()};
+            new MutationObserver(function() { window.__cilReadiness.last = performance.now(); })
+                .observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+        }
+        var rows = 0;
+        document.querySelectorAll('.Details_customHorizontal, .Details_customVertical').forEach(function(el) {
+            var spans = el.querySelectorAll('span');
+            if (el.querySelector('.Details_name') && spans.length >= 2 && spans[1].textContent.trim()) { rows++; }
+        });
+        return {
+            state: document.readyState,
+            rows: rows,
+            dom_idle_ms: performance.now() - window.__cilReadiness.last,
+            resources: performance.getEntriesByType('resource').length
+        };
+    """
+
+    def __init__(self, timeout=20, quiet_ms=800, poll_interval=0.2):
+        self.timeout = timeout
+        self.quiet_ms = quiet_ms
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.waits = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.reasons = {}
+
+    def wait(self, driver, timeout=None, require_details=False):
+        """等待页面就绪，返回(原因, 耗时秒数)
+
+        原因: details=详情行已渲染, quiet=DOM与网络均已静默, timeout=达到上限
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        last_resources = -1
+        resources_changed_at = start
+        reason = 'timeout'
+
+        while True:
+            now = time.monotonic()
+            try:
+                signals = driver.execute_script(self.SIGNALS_JS) or {}
+            except Exception:
+                signals = {}
+
+            if signals.get('resources', -1) != last_resources:
+                last_resources = signals.get('resources', -1)
+                resources_changed_at = now
+
+            if signals.get('state') == 'complete':
+                if signals.get('rows', 0) > 0:
+                    reason = 'details'
+                    break
+                network_idle_ms = (now - resources_changed_at) * 1000
+                if (not require_details and signals.get('dom_idle_ms', 0) >= self.quiet_ms
+                        and network_idle_ms >= self.quiet_ms):
+                    reason = 'quiet'
+                    break
+
+            if now >= deadline:
+                break
+            time.sleep(self.poll_interval)
+
+        elapsed = time.monotonic() - start
+        self.record(reason, elapsed)
+        return reason, elapsed
+
+    def record(self, reason, elapsed):
+        with self.lock:
+            self.waits += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def summary(self):
+        """就绪等待统计"""
+        with self.lock:
+            average = self.total_seconds / self.waits if self.waits else 0.0
+            return f"{self.waits} 次, 平均 {average:.2f}s, 最长 {self.max_seconds:.2f}s, 原因分布 {self.reasons}"
+
+
+class CrawlJournal:
+    """追加写入的JSONL爬取日志，每条记录一个URL的结果，批量fsync"""
+
+    def __init__(self, path, append=False, fsync_every=20, fsync_interval=5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def record(self, url, status, product=None, error=''):
+        """追加一条结果: status 为 ok / skipped / failed"""
+        entry = {'url': url, 'status': status, 'time': datetime.now().isoformat(timespec='seconds')}
+        if product is not None:
+            entry['product'] = product
+        if error:
+            entry['error'] = error
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(line + '\n')
+            self.pending += 1
+            if self.pending >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()
+
+    @staticmethod
+    def load(path):
+        """读取日志，返回每个URL最新的一条记录"""
+        entries = {}
+        if not os.path.exists(path):
+            return entries
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 进程中断时最后一行可能不完整
+                entries[entry['url']] = entry
+        return entries
+
+
+class StreamingResultWriter:
+    """逐条写入产品结果 (CSV，可选JSONL)，内存占用与产品数量无关"""
+
+    QUALITY_FIELDS = ['name', 'cas_labeled', 'cas_unlabeled', 'formula', 'image_url']
+
+    def __init__(self, csv_path, jsonl_path=None, fieldnames=None):
+        self.csv_path = csv_path
+        self.jsonl_path = jsonl_path
+        self.lock = threading.Lock()
+        self.count = 0
+        self.filled = {field: 0 for field in self.QUALITY_FIELDS}
+        self.csv_file = open(csv_path, 'w', encoding='utf-8', newline='')
+        self.csv_writer = csv.DictWriter(self.csv_file, fieldnames=fieldnames or PRODUCT_FIELDS, extrasaction='ignore')
+        self.csv_writer.writeheader()
+        self.jsonl_file = open(jsonl_path, 'w', encoding='utf-8') if jsonl_path else None
+
+    def write(self, product_info):
+        """写入一条产品记录并立即刷新到磁盘"""
+        with self.lock:
+            self.csv_writer.writerow(product_info)
+            self.csv_file.flush()
+            if self.jsonl_file:
+                self.jsonl_file.write(json.dumps(product_info, ensure_ascii=False) + '\n')
+                self.jsonl_file.flush()
+            self.count += 1
+            for field in self.QUALITY_FIELDS:
+                if product_info.get(field):
+                    self.filled[field] += 1
+
+    def close(self):
+        with self.lock:
+            if not self.csv_file.closed:
+                self.csv_file.close()
+            if self.jsonl_file and not self.jsonl_file.closed:
+                self.jsonl_file.close()
+
+
+def convert_csv_to_xlsx(csv_path, xlsx_path):
+    """用openpyxl只写模式把CSV流式转换为Excel"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            sheet.append(row)
+    workbook.save(xlsx_path)
+
+
+class JobQueueBackend:
+    """拉取式任务队列接口：协调器入队，worker租用任务并回报结果"""
+
+    def enqueue(self, urls):
+        """批量加入URL，已存在的URL忽略，返回新加入的数量"""
+        raise NotImplementedError
+
+    def lease(self, worker_id, lease_seconds):
+        """租用一个待处理任务，返回 {'url', 'attempts'} 或 None；过期的租约会被重新放回队列 (已达到最大尝试次数的标记为失败)"""
+        raise NotImplementedError
+
+    def report(self, url, status, worker_id, product=None, error=''):
+        """回报任务结果: ok / skipped / failed (失败且未超过重试次数时重新入队)
+
+        只有仍持有该任务租约的worker能回报，返回是否生效；租约过期后被他人接手时旧worker的回报被忽略
+        """
+        raise NotImplementedError
+
+    def set_producing(self, producing):
+        """协调器边发现边入队时设为True，期间队列暂时为空worker也不会退出"""
+        raise NotImplementedError
+
+    def is_drained(self):
+        """没有待处理和已租出的任务，且协调器已停止入队时返回True"""
+        raise NotImplementedError
+
+    def stats(self):
+        """各状态的任务数量"""
+        raise NotImplementedError
+
+    def iter_products(self):
+        """遍历已成功任务的产品记录"""
+        raise NotImplementedError
+
+    def iter_urls(self, status):
+        """遍历指定状态的URL"""
+        raise NotImplementedError
+
+
+class SQLiteJobQueue(JobQueueBackend):
+    """基于SQLite的本地任务队列，支持多线程和同一主机上的多进程"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT UNIQUE NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            lease_until REAL,
+            product TEXT,
+            error TEXT,
+            updated REAL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+        CREATE TABLE IF NOT EXISTS queue_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.local = threading.local()
+        self.connection().executescript(self.SCHEMA)
+
+    def connection(self):
+        # sqlite3连接不能跨线程共享，每个线程各自打开
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def enqueue(self, urls):
+        conn = self.connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO jobs (url, updated) VALUES (?, ?)', ((url, now) for url in urls))
+            added = conn.total_changes - before
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return added
+
+    def lease(self, worker_id, lease_seconds):
+        conn = self.connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 租约过期视为一次失败：未用完重试次数的放回队列，用完的直接标记失败
+            expired = conn.execute(
+                "UPDATE jobs SET status = 'failed', worker = NULL, error = 'lease expired', updated = ? "
+                "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts)).rowcount
+            stale = conn.execute(
+                "UPDATE jobs SET status = 'pending', worker = NULL WHERE status = 'leased' AND lease_until < ?",
+                (now,)).rowcount
+            if expired:
+                logger.warning(f"{expired} 个任务租约过期且已达到最大尝试次数，标记为失败")
+            if stale:
+                logger.warning(f"{stale} 个任务租约过期，重新放回队列")
+            row = conn.execute("SELECT id, url, attempts FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                "WHERE id = ?", (worker_id, now + lease_seconds, now, row[0]))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return {'url': row[1], 'attempts': row[2] + 1}
+
+    def report(self, url, status, worker_id, product=None, error=''):
+        conn = self.connection()
+        now = time.time()
+        product_json = json.dumps(product, ensure_ascii=False) if product is not None else None
+        if status == 'failed':
+            updated = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+                "worker = NULL, error = ?, updated = ? WHERE url = ? AND status = 'leased' AND worker = ?",
+                (self.max_attempts, error, now, url, worker_id)).rowcount
+        else:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, product = ?, error = NULL, updated = ? "
+                "WHERE url = ? AND status = 'leased' AND worker = ?",
+                ('done' if status == 'ok' else status, product_json, now, url, worker_id)).rowcount
+        if not updated:
+            logger.warning(f"{worker_id} 已不再持有 {url} 的租约，忽略回报 ({status})")
+        return bool(updated)
+
+    def set_producing(self, producing):
+        self.connection().execute("INSERT OR REPLACE INTO queue_state (key, value) VALUES ('producing', ?)",
+                                  ('1' if producing else '0',))
+
+    def is_drained(self):
+        conn = self.connection()
+        row = conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'leased')").fetchone()
+        if row[0]:
+            return False
+        state = conn.execute("SELECT value FROM queue_state WHERE key = 'producing'").fetchone()
+        return not state or state[0] != '1'
+
+    def stats(self):
+        rows = self.connection().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict(rows)
+
+    def iter_products(self):
+        for (product_json,) in self.connection().execute(
+                "SELECT product FROM jobs WHERE status = 'done' AND product IS NOT NULL ORDER BY id"):
+            yield json.loads(product_json)
+
+    def iter_urls(self, status):
+        for (url,) in self.connection().execute('SELECT url FROM jobs WHERE status = ? ORDER BY id', (status,)):
+            yield url
+
+
+def open_job_queue(spec, max_attempts=3):
+    """根据队列地址创建后端: 'sqlite:///path/queue.db' 或直接给出文件路径"""
+    if spec.startswith('sqlite:///'):
+        return SQLiteJobQueue(spec[len('sqlite:///'):], max_attempts=max_attempts)
+    if '://' in spec:
+        raise ValueError(f"不支持的队列后端: {spec}")
+    return SQLiteJobQueue(spec, max_attempts=max_attempts)
+
+
+class HttpStatusError(Exception):
+    """HTTP请求返回了错误状态码"""
+
+    def __init__(self, status, url):
+        super().__init__(f"HTTP {status}: {url}")
+        self.status = status
+
+
+FAILURE_CLASSES = ['timeout', 'driver_crash', 'http_5xx', 'network', 'empty_extraction', 'other']
+
+
+def classify_failure(error):
+    """把异常 (或已知类别字符串) 归类为失败类型"""
+    if isinstance(error, str):
+        return error if error in FAILURE_CLASSES else 'other'
+    message = str(error).lower()
+    if isinstance(error, (TimeoutException, requests.Timeout, asyncio.TimeoutError, TimeoutError)) \
+            or 'timed out' in message or 'timeout' in message:
+        return 'timeout'
+    if isinstance(error, HttpStatusError):
+        return 'http_5xx' if error.status >= 500 else 'other'
+    if isinstance(error, WebDriverException) or 'chrome' in message or 'session' in message:
+        return 'driver_crash'
+    if isinstance(error, (requests.ConnectionError, ConnectionError, OSError)):
+        return 'network'
+    return 'other'
+
+
+class RetryScheduler:
+    """按失败类型统计并以指数退避把失败的URL重新排到队尾"""
+
+    def __init__(self, max_attempts=3, base_delay=10.0, max_delay=300.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.attempts = {}
+        self.last_class = {}
+        self.due = []
+        self.stats = {name: {'failures': 0, 'retried': 0, 'recovered': 0, 'gave_up': 0} for name in FAILURE_CLASSES}
+
+    def schedule(self, url, failure_class):
+        """记录一次失败；仍有重试预算时安排重试并返回延迟秒数，否则返回None"""
+        with self.lock:
+            attempts = self.attempts.get(url, 1)
+            stats = self.stats[failure_class]
+            stats['failures'] += 1
+            self.last_class[url] = failure_class
+            if attempts >= self.max_attempts:
+                stats['gave_up'] += 1
+                self.last_class.pop(url, None)  # 已放弃，之后的空结果不再计为恢复
+                return None
+            self.attempts[url] = attempts + 1
+            delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1))) * random.uniform(0.8, 1.2)
+            heapq.heappush(self.due, (time.monotonic() + delay, url))
+            stats['retried'] += 1
+            return delay
+
+    def record_success(self, url):
+        """重试后成功时计入恢复统计"""
+        with self.lock:
+            failure_class = self.last_class.pop(url, None)
+            if failure_class:
+                self.stats[failure_class]['recovered'] += 1
+
+    def pop_due(self):
+        """取出已到重试时间的URL"""
+        now = time.monotonic()
+        urls = []
+        with self.lock:
+            while self.due and self.due[0][0] <= now:
+                urls.append(heapq.heappop(self.due)[1])
+        return urls
+
+    def pending(self):
+        with self.lock:
+            return len(self.due)
+
+    def next_due_in(self):
+        """距离下一个重试的秒数，没有待重试时返回None"""
+        with self.lock:
+            if not self.due:
+                return None
+            return max(0.0, self.due[0][0] - time.monotonic())
+
+    def summary(self):
+        with self.lock:
+            return {name: dict(stats) for name, stats in self.stats.items() if stats['failures']}
+
+
+class StageMetrics:
+    """按阶段统计耗时分布，导出JSON报告和Prometheus文本格式"""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.server = None
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """记录with块的耗时，异常时同样计入"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    @staticmethod
+    def percentile(sorted_values, q):
+        """最近秩法计算分位数"""
+        if not sorted_values:
+            return 0.0
+        rank = max(1, math.ceil(q * len(sorted_values)))
+        return sorted_values[rank - 1]
+
+    def report(self):
+        """返回 {阶段: {count, total, mean, p50, p95, p99, max}}"""
+        with self.lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+        stages = {}
+        for stage, values in samples.items():
+            total = sum(values)
+            stats = {'count': len(values), 'total': round(total, 4), 'mean': round(total / len(values), 4)}
+            for q in self.QUANTILES:
+                stats[f'p{int(q * 100)}'] = round(self.percentile(values, q), 4)
+            stats['max'] = round(values[-1], 4)
+            stages[stage] = stats
+        return stages
+
+    def write_json(self, path, extra=None):
+        report = {'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                  'elapsed': round(time.time() - self.started, 2),
+                  'stages': self.report()}
+        report.update(extra or {})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    def prometheus_text(self):
+        """Prometheus summary格式的文本"""
+        lines = ['# HELP scraper_stage_seconds 各阶段耗时 (秒)',
+                 '# TYPE scraper_stage_seconds summary']
+        with self.lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+        for stage, values in sorted(samples.items()):
+            for q in self.QUANTILES:
+                lines.append(f'scraper_stage_seconds{{stage="{stage}",quantile="{q}"}} {self.percentile(values, q):.6f}')
+            lines.append(f'scraper_stage_seconds_sum{{stage="{stage}"}} {sum(values):.6f}')
+            lines.append(f'scraper_stage_seconds_count{{stage="{stage}"}} {len(values)}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """写入textfile collector使用的.prom文件 (先写临时文件再替换)"""
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """在后台线程提供 /metrics 端点，默认只监听本机"""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"指标端点已启动: http://{host}:{port}/metrics")
+
+    def log_report(self):
+        for stage, stats in self.report().items():
+            logger.info(f"阶段 {stage}: {stats['count']} 次, p50 {stats['p50']:.3f}s, "
+                        f"p95 {stats['p95']:.3f}s, p99 {stats['p99']:.3f}s")
+
+
+class ReplayDriver:
+    """从PageStore回放页面的WebDriver替身，提取流程无需启动浏览器"""
+
+    def __init__(self, store):
+        self.store = store
+        self.page_source = ''
+        self.current_url = ''
+        self.title = ''
+        self.snapshot = None
+
+    def get(self, url):
+        meta, page_html = self.store.load(url)
+        self.page_source = page_html
+        self.current_url = meta['final_url']
+        self.snapshot = None
+
+    def execute_script(self, script, *args):
+        if script is PageReadiness.SIGNALS_JS:
+            rows = len(self.get_snapshot()['details'])
+            return {'state': 'complete', 'rows': rows, 'dom_idle_ms': 10 ** 6, 'resources': 0}
+        if script is EXTRACT_PAGE_JS:
+            return self.get_snapshot()
+        return 1
+
+    def get_snapshot(self):
+        if self.snapshot is None:
+            self.snapshot = snapshot_from_html(self.page_source, self.current_url)
+            self.title = self.snapshot['title']
+        return self.snapshot
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {}
+
+    def quit(self):
+        pass
+
+
+class BrowserMemoryWatchdog:
+    """监控每个WebDriver的chromedriver/Chrome进程树RSS
+
+    单个浏览器超出预算时在归还时回收，主机内存使用率超过上限时关闭空闲浏览器并暂停借出，
+    至少保留一个worker继续运行，爬取变慢但不会触发OOM。
+    """
+
+    def __init__(self, driver_budget_mb=1024, host_limit_percent=90.0, interval=5.0):
+        try:
+            import psutil
+        except ImportError:
+            raise RuntimeError("浏览器内存监控需要psutil，请执行: pip install psutil")
+        self.psutil = psutil
+        self.driver_budget_mb = driver_budget_mb
+        self.host_limit_percent = host_limit_percent
+        self.interval = interval
+        self.pressure = False
+        self.recycled = 0
+        self.pauses = 0
+        self.peak_driver_mb = 0.0
+        self.peak_host_percent = 0.0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def driver_rss_mb(self, driver):
+        """chromedriver及其全部子进程 (Chrome浏览器、渲染进程) 的RSS总和 (MB)，无法获取时返回None"""
+        pid = getattr(getattr(getattr(driver, 'service', None), 'process', None), 'pid', None)
+        if pid is None:
+            return None
+        try:
+            root = self.psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except self.psutil.Error:
+            return None
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except self.psutil.Error:
+                pass
+        rss_mb = total / (1024 * 1024)
+        with self.lock:
+            self.peak_driver_mb = max(self.peak_driver_mb, rss_mb)
+        return rss_mb
+
+    def over_budget(self, driver):
+        """返回超出预算的RSS (MB)，未超出时返回None"""
+        if not self.driver_budget_mb:
+            return None
+        rss_mb = self.driver_rss_mb(driver)
+        if rss_mb is not None and rss_mb > self.driver_budget_mb:
+            return rss_mb
+        return None
+
+    def check_host(self):
+        """更新主机内存压力状态"""
+        if not self.host_limit_percent:
+            self.pressure = False
+            return False
+        percent = self.psutil.virtual_memory().percent
+        self.peak_host_percent = max(self.peak_host_percent, percent)
+        pressure = percent >= self.host_limit_percent
+        if pressure != self.pressure:
+            if pressure:
+                logger.warning(f"主机内存使用率 {percent:.0f}% 超过上限 {self.host_limit_percent:.0f}%，暂停借出新的WebDriver")
+            else:
+                logger.info(f"主机内存使用率降至 {percent:.0f}%，恢复借出WebDriver")
+        self.pressure = pressure
+        return pressure
+
+    def record_pause(self):
+        with self.lock:
+            self.pauses += 1
+
+    def record_recycle(self):
+        with self.lock:
+            self.recycled += 1
+
+    def sweep(self, pool):
+        """检查主机内存和空闲浏览器，内存紧张时关闭全部空闲浏览器"""
+        if self.check_host():
+            for driver in pool.drain_idle():
+                pool._destroy(driver)
+            return
+        for driver in pool.idle_snapshot():
+            rss_mb = self.over_budget(driver)
+            if rss_mb is not None and pool.remove_idle(driver):
+                logger.info(f"空闲WebDriver内存 {rss_mb:.0f}MB 超出预算 {self.driver_budget_mb}MB，回收")
+                self.record_recycle()
+                pool._destroy(driver)
+
+    def start(self, pool):
+        """在后台线程按周期巡检"""
+        self.stop_event.clear()
+
+        def loop():
+            while not self.stop_event.wait(self.interval):
+                try:
+                    self.sweep(pool)
+                except Exception as e:
+                    logger.warning(f"浏览器内存巡检出错: {e}")
+
+        self.thread = threading.Thread(target=loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def summary(self):
+        return {'peak_driver_mb': round(self.peak_driver_mb), 'peak_host_percent': round(self.peak_host_percent, 1),
+                'recycled_over_budget': self.recycled, 'pauses': self.pauses}
+
+
+class DriverPool:
+    """长期存活的WebDriver池，每个工作线程对应一个浏览器实例"""
+
+    def __init__(self, driver_factory, size, max_pages=50, metrics=None, watchdog=None):
+        self.driver_factory = driver_factory
+        self.watchdog = watchdog
+        self.metrics = metrics or StageMetrics()
+        self.size = size
+        self.max_pages = max_pages
+        self.idle = queue.LifoQueue()
+        # 同时借出的上限，可由自动调节在 1..size 之间调整
+        self.limit = size
+        self.active = 0
+        # 已通过内存检查、实际持有浏览器的worker数 (不含等待内存的线程)
+        self.holding = 0
+        self.slots = threading.Condition()
+        self.page_counts = {}
+        self.lock = threading.Lock()
+        self.created = 0
+        self.recycled = 0
+        self.closed = False
+        if self.watchdog:
+            self.watchdog.start(self)
+
+    def is_healthy(self, driver):
+        """检查浏览器会话是否仍然可用"""
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def checkout(self):
+        """借出一个可用的WebDriver，必要时新建"""
+        if self.closed:
+            raise RuntimeError("WebDriver池已关闭")
+        self.acquire_slot()
+        try:
+            while True:
+                try:
+                    driver = self.idle.get_nowait()
+                except queue.Empty:
+                    break
+                if self.is_healthy(driver):
+                    return driver
+                logger.warning("检测到失效的WebDriver，重新创建")
+                self._destroy(driver)
+
+            with self.metrics.timer('driver_create'):
+                driver = self.driver_factory()
+            with self.lock:
+                self.page_counts[id(driver)] = 0
+                self.created += 1
+            return driver
+        except Exception:
+            self.release_slot()
+            raise
+
+    def checkin(self, driver, broken=False):
+        """归还WebDriver，达到页面上限或崩溃时回收"""
+        try:
+            with self.lock:
+                pages = self.page_counts.get(id(driver), 0) + 1
+                self.page_counts[id(driver)] = pages
+
+            rss_mb = None
+            if self.watchdog and not (self.closed or broken):
+                rss_mb = self.watchdog.over_budget(driver)
+            if self.closed or broken or pages >= self.max_pages:
+                if not self.closed:
+                    logger.info(f"回收WebDriver (已处理 {pages} 个页面, 异常: {broken})")
+                    with self.lock:
+                        self.recycled += 1
+                self._destroy(driver)
+            elif rss_mb is not None:
+                logger.info(f"回收WebDriver (内存 {rss_mb:.0f}MB 超出预算 {self.watchdog.driver_budget_mb}MB, "
+                            f"已处理 {pages} 个页面)")
+                with self.lock:
+                    self.recycled += 1
+                self.watchdog.record_recycle()
+                self._destroy(driver)
+            elif self.idle.qsize() >= self.limit:
+                # 上限已下调，多余的浏览器直接关闭释放内存
+                self._destroy(driver)
+            else:
+                self.idle.put(driver)
+        finally:
+            self.release_slot()
+
+    def memory_pressure(self):
+        return self.watchdog is not None and self.watchdog.pressure
+
+    def acquire_slot(self):
+        """占用一个借出名额；主机内存紧张时只在没有其他worker持有浏览器时放行，保证至少一个worker继续运行"""
+        paused = False
+        with self.slots:
+            while self.active >= self.limit:
+                self.slots.wait()
+            self.active += 1
+            while self.memory_pressure() and self.holding and not self.closed:
+                if not paused:
+                    paused = True
+                    self.watchdog.record_pause()
+                self.slots.wait(timeout=0.5)  # 压力状态由巡检线程更新，定期重新检查
+            self.holding += 1
+
+    def release_slot(self):
+        with self.slots:
+            self.active -= 1
+            self.holding -= 1
+            self.slots.notify_all()
+
+    def idle_snapshot(self):
+        with self.idle.mutex:
+            return list(self.idle.queue)
+
+    def remove_idle(self, driver):
+        """从空闲队列中取走指定的WebDriver，已被借出时返回False"""
+        with self.idle.mutex:
+            if driver in self.idle.queue:
+                self.idle.queue.remove(driver)
+                return True
+            return False
+
+    def drain_idle(self):
+        """取出全部空闲的WebDriver"""
+        drivers = []
+        while True:
+            try:
+                drivers.append(self.idle.get_nowait())
+            except queue.Empty:
+                return drivers
+
+    def set_limit(self, limit):
+        """调整同时借出的WebDriver上限，超出上限的空闲浏览器立即关闭"""
+        with self.slots:
+            self.limit = max(1, min(limit, self.size))
+            self.slots.notify_all()
+        while self.idle.qsize() > self.limit:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(driver)
+
+    def _destroy(self, driver):
+        with self.lock:
+            self.page_counts.pop(id(driver), None)
+        try:
+            with self.metrics.timer('driver_quit'):
+                driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        """关闭池中所有空闲的WebDriver"""
+        self.closed = True
+        if self.watchdog:
+            self.watchdog.stop()
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(driver)
+        logger.info(f"WebDriver池已关闭: 共创建 {self.created} 个, 回收 {self.recycled} 个")
+        if self.watchdog and self.created:
+            logger.info(f"浏览器内存监控: {self.watchdog.summary()}")
+
+
+class ConcurrencyTuner:
+    """根据页面延迟、错误率和主机内存，在运行中调整活跃worker数量
+
+    每个调节周期比较吞吐量：增加worker后吞吐量明显提升就继续增加，否则退回一步并保持几个周期；
+    错误率过高、限速器退避、延迟大幅上升或可用内存不足时按比例减少。
+    """
+
+    def __init__(self, max_workers, min_workers=1, interval=15.0, min_samples=5, max_error_rate=0.2,
+                 latency_factor=3.0, reserve_mb=1024, hold_rounds=3, rate_limiter=None):
+        try:
+            import psutil
+        except ImportError:
+            raise RuntimeError("自动调节并发需要psutil，请执行: pip install psutil")
+        self.psutil = psutil
+        self.process = psutil.Process()
+        self.max_workers = max(1, max_workers)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        self.limit = self.min_workers
+        self.peak = self.limit
+        self.interval = interval
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.latency_factor = latency_factor
+        self.reserve_mb = reserve_mb
+        self.hold_rounds = hold_rounds
+        self.rate_limiter = rate_limiter
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.history = []
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.reset_window()
+
+    def reset_window(self):
+        with self.lock:
+            self.completed = 0
+            self.failed = 0
+            self.latencies = []
+            self.window_started = time.monotonic()
+        self.last_throughput = None
+        self.last_step = 0
+        self.hold = 0
+        self.best_latency = None
+        self.last_backoffs = self.rate_limiter.backoffs if self.rate_limiter else 0
+        self.last_swap_out = self.swap_out()
+        self.base_rss_mb = self.tree_rss_mb()
+
+    def observe(self, seconds):
+        """记录一个URL的处理耗时"""
+        with self.lock:
+            self.completed += 1
+            self.latencies.append(seconds)
+
+    def observe_failure(self):
+        with self.lock:
+            self.failed += 1
+
+    def on_change(self, callback):
+        """注册上限变化回调，注册时立即以当前上限调用一次"""
+        self.listeners.append(callback)
+        callback(self.limit)
+
+    def tree_rss_mb(self):
+        """本进程及全部子进程 (chromedriver/Chrome) 的RSS总和 (MB)"""
+        total = 0
+        try:
+            processes = [self.process] + self.process.children(recursive=True)
+        except self.psutil.Error:
+            processes = [self.process]
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except self.psutil.Error:
+                pass
+        return total / (1024 * 1024)
+
+    def swap_out(self):
+        try:
+            return self.psutil.swap_memory().sout
+        except Exception:
+            return 0
+
+    def step(self):
+        """结束一个调节周期，返回新的worker上限"""
+        available_mb = self.psutil.virtual_memory().available / (1024 * 1024)
+        swap_out = self.swap_out()
+        swapping = swap_out > self.last_swap_out
+        self.last_swap_out = swap_out
+        # 每个worker的实测内存占用，用来判断再加一个是否还有余量
+        per_worker_mb = max(0.0, self.tree_rss_mb() - self.base_rss_mb) / self.limit
+
+        if available_mb < self.reserve_mb or swapping:
+            with self.lock:
+                self.completed = self.failed = 0
+                self.latencies = []
+                self.window_started = time.monotonic()
+            reason = '内存不足' if available_mb < self.reserve_mb else '发生换页'
+            self.hold = self.hold_rounds
+            return self.apply(self.limit - max(1, self.limit // 4), reason, available_mb=round(available_mb))
+
+        with self.lock:
+            if self.completed < self.min_samples:
+                return self.limit  # 样本不足，延长本周期
+            completed, failed = self.completed, self.failed
+            latencies = sorted(self.latencies)
+            elapsed = time.monotonic() - self.window_started
+            self.completed = self.failed = 0
+            self.latencies = []
+            self.window_started = time.monotonic()
+
+        throughput = completed / elapsed if elapsed > 0 else 0.0
+        error_rate = failed / completed
+        p50 = StageMetrics.percentile(latencies, 0.5)
+        backoffs = self.rate_limiter.backoffs if self.rate_limiter else 0
+        throttled = backoffs > self.last_backoffs
+        self.last_backoffs = backoffs
+        if self.best_latency is None or p50 < self.best_latency:
+            self.best_latency = p50
+        stats = {'throughput': round(throughput, 3), 'error_rate': round(error_rate, 3),
+                 'p50': round(p50, 3), 'available_mb': round(available_mb), 'per_worker_mb': round(per_worker_mb)}
+
+        previous, self.last_throughput = self.last_throughput, throughput
+        if error_rate > self.max_error_rate or throttled:
+            self.hold = self.hold_rounds
+            reason = '被限速' if throttled else '错误率过高'
+            return self.apply(self.limit - max(1, self.limit // 4), reason, **stats)
+        if p50 > self.best_latency * self.latency_factor and self.limit > self.min_workers:
+            self.hold = self.hold_rounds
+            return self.apply(self.limit - 1, '延迟上升', **stats)
+        if self.hold:
+            self.hold -= 1
+            return self.apply(self.limit, '保持', **stats)
+        if self.last_step > 0 and previous is not None and throughput < previous * 1.05:
+            # 上次增加没有带来吞吐量提升，退回并保持
+            self.hold = self.hold_rounds
+            return self.apply(self.limit - 1, '吞吐量不再提升', **stats)
+        if self.limit < self.max_workers and available_mb - per_worker_mb > self.reserve_mb:
+            return self.apply(self.limit + 1, '增加', **stats)
+        return self.apply(self.limit, '保持', **stats)
+
+    def apply(self, limit, reason, **stats):
+        limit = max(self.min_workers, min(limit, self.max_workers))
+        self.last_step = limit - self.limit
+        if limit != self.limit:
+            logger.info(f"自动调节: worker {self.limit} -> {limit} ({reason}, {stats})")
+            self.history.append({'time': round(time.time(), 1), 'from': self.limit, 'to': limit,
+                                 'reason': reason, **stats})
+            self.limit = limit
+            self.peak = max(self.peak, limit)
+            for callback in self.listeners:
+                callback(limit)
+        return self.limit
+
+    def start(self):
+        """在后台线程按周期调节"""
+        self.reset_window()
+        self.stop_event.clear()
+
+        def loop():
+            while not self.stop_event.wait(self.interval):
+                try:
+                    self.step()
+                except Exception as e:
+                    logger.warning(f"自动调节出错: {e}")
+
+        self.thread = threading.Thread(target=loop, daemon=True)
+        self.thread.start()
+        logger.info(f"自动调节已启动: worker {self.min_workers}-{self.max_workers}, 周期 {self.interval}s, "
+                    f"保留内存 {self.reserve_mb}MB")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def summary(self):
+        return {'limit': self.limit, 'min': self.min_workers, 'max': self.max_workers, 'peak': self.peak,
+                'adjustments': len(self.history), 'history': self.history[-20:]}
+
+
+class UrlFeed:
+    """线程安全的URL流：发现线程边发现边写入，爬取循环边读取边提交"""
+
+    def __init__(self, limit=None, accept=None):
+        self.limit = limit
+        self.accept = accept
+        self.accepted = 0
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+
+    @classmethod
+    def from_urls(cls, urls, limit=None, accept=None):
+        """由已知的URL列表构造一个已关闭的URL流"""
+        feed = cls(limit=limit, accept=accept)
+        for url in urls:
+            feed.put(url)
+        feed.close()
+        return feed
+
+    def put(self, url):
+        """写入一个URL，返回是否被接受"""
+        if self.accept and not self.accept(url):
+            return False
+        with self.condition:
+            if self.closed or self.full():
+                return False
+            self.pending.append(url)
+            self.accepted += 1
+            self.condition.notify_all()
+        return True
+
+    def full(self):
+        return bool(self.limit) and self.accepted >= self.limit
+
+    def close(self):
+        """输入结束"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def take(self, count):
+        """不阻塞地取出最多count个URL"""
+        urls = []
+        with self.condition:
+            while self.pending and len(urls) < count:
+                urls.append(self.pending.popleft())
+        return urls
+
+    def wait(self, timeout=None):
+        """等待新的URL或输入结束"""
+        with self.condition:
+            if not self.pending and not self.closed:
+                self.condition.wait(timeout)
+
+    def exhausted(self):
+        with self.condition:
+            return self.closed and not self.pending
+
+
+class UrlDedupIndex:
+    """按规范产品编号/规范URL折叠同一SKU的URL变体，每组只抓取一次，结果再展开到所有别名"""
+
+    def __init__(self):
+        self.aliases = {}
+        self.fetch_owner = {}
+        self.lock = threading.Lock()
+        self.input_count = 0
+
+    def collapse(self, urls):
+        """折叠URL列表，返回需要抓取的主URL；保持输入顺序，同组优先选择不带查询参数的URL"""
+        groups = {}
+        for url in urls:
+            group = groups.setdefault(canonical_key(url), [])
+            if url not in group:
+                group.append(url)
+        primaries = []
+        with self.lock:
+            self.input_count += len(urls)
+            for group in groups.values():
+                primary = next((url for url in group if not urlparse(url).query), group[0])
+                self.aliases[primary] = [url for url in group if url != primary]
+                primaries.append(primary)
+        return primaries
+
+    def redirect(self, url, final_url):
+        """url改为抓取重定向后的final_url，结果仍记录在url名下"""
+        with self.lock:
+            self.fetch_owner[final_url] = url
+
+    def merge(self, url, into):
+        """url及其别名并入into的别名 (两者指向同一页面)"""
+        with self.lock:
+            aliases = self.aliases.pop(url, [])
+            self.aliases.setdefault(into, []).extend([url] + aliases)
+
+    def original_of(self, url):
+        """抓取URL对应的原始输入URL (未重定向时为其本身)"""
+        with self.lock:
+            return self.fetch_owner.get(url, url)
+
+    def aliases_of(self, url):
+        with self.lock:
+            return list(self.aliases.get(url, ()))
+
+    def summary(self):
+        with self.lock:
+            alias_count = sum(len(aliases) for aliases in self.aliases.values())
+            return {'urls': self.input_count, 'fetch': len(self.aliases), 'aliases': alias_count}
+
+
+class PreflightChecker:
+    """批量并发HEAD预检：过滤404和失效链接、解析重定向，结果缓存到JSON文件供之后的运行复用"""
+
+    CACHEABLE_STATES = ('ok', 'not_found', 'error')
+
+    def __init__(self, rate_limiter, headers=None, concurrency=32, cache_path=None, ttl=86400, timeout=10):
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.timeout = timeout
+        # 独立的连接池，大小与并发数一致
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.cache = self.load_cache()
+        self.cache_hits = 0
+
+    def load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"预检缓存读取失败，重新探测: {e}")
+            return {}
+
+    def save_cache(self):
+        """只缓存确定的结果 (超时和连接失败下次重新探测)"""
+        if not self.cache_path:
+            return
+        entries = {url: entry for url, entry in self.cache.items() if entry['state'] in self.CACHEABLE_STATES}
+        tmp_path = f'{self.cache_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def classify(status):
+        """把HEAD状态码归类为 ok/not_found/error/unknown"""
+        if 200 <= status < 300:
+            return 'ok'
+        if status in (404, 410):
+            return 'not_found'
+        if status in (405, 501, 429) or status >= 500:
+            return 'unknown'  # 不支持HEAD或暂时性错误，交给worker处理
+        if status >= 400:
+            return 'error'
+        return 'unknown'
+
+    def probe(self, url):
+        """HEAD探测单个URL；连接失败时再试一次，仍失败判定为失效链接"""
+        error = None
+        for attempt in range(2):
+            self.rate_limiter.acquire(url)
+            start = time.monotonic()
+            status = retry_after = None
+            try:
+                response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+                status = response.status_code
+                retry_after = HostRateLimiter.parse_retry_after(response.headers.get('Retry-After'))
+                return {'state': self.classify(status), 'status': status, 'final_url': response.url,
+                        'redirects': len(response.history), 'checked': time.time()}
+            except requests.Timeout:
+                return {'state': 'unknown', 'status': None, 'final_url': url, 'checked': time.time()}
+            except requests.ConnectionError as e:
+                error = e
+            except requests.RequestException as e:
+                return {'state': 'unknown', 'status': None, 'final_url': url, 'error': str(e), 'checked': time.time()}
+            finally:
+                self.rate_limiter.release(url, status, time.monotonic() - start, retry_after)
+            if attempt == 0:
+                time.sleep(1)
+        return {'state': 'dead', 'status': None, 'final_url': url, 'error': str(error), 'checked': time.time()}
+
+    def run(self, urls):
+        """并发探测全部URL (缓存未过期的直接复用)，返回 {url: 结果}"""
+        now = time.time()
+        results = {}
+        to_probe = []
+        for url in urls:
+            entry = self.cache.get(url)
+            if entry and now - entry.get('checked', 0) < self.ttl:
+                results[url] = entry
+                self.cache_hits += 1
+            else:
+                to_probe.append(url)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for url, result in zip(to_probe, executor.map(self.probe, to_probe)):
+                results[url] = result
+                self.cache[url] = result
+        self.save_cache()
+        return results
+
+
+class CatalogDiscovery:
+    """从sitemap和分类列表页流式发现产品URL，按产品编号去重后写入UrlFeed"""
+
+    def __init__(self, session=None, rate_limiter=None, max_pages=2000, max_depth=3, output_path=None):
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            })
+        self.session = session
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.output_path = output_path
+        self.seen_products = set()
+        self.visited = set()
+        self.pages_fetched = 0
+        self.found = 0
+        self.duplicates = 0
+        self.thread = None
+
+    @staticmethod
+    def is_sitemap(url):
+        path = urlparse(url).path.lower()
+        return 'sitemap' in path or path.endswith(('.xml', '.xml.gz'))
+
+    def fetch(self, url):
+        """经过限速器获取页面，返回(最终URL, 内容字节)；.gz的sitemap自动解压"""
+        self.rate_limiter.acquire(url)
+        start = time.monotonic()
+        status = None
+        try:
+            response = self.session.get(url, timeout=30)
+            status = response.status_code
+            response.raise_for_status()
+            content = response.content
+            if content[:2] == b'\x1f\x8b':
+                content = gzip.decompress(content)
+            return response.url, content
+        finally:
+            self.rate_limiter.release(url, status=status, elapsed=time.monotonic() - start)
+
+    @staticmethod
+    def parse_sitemap(content):
+        """解析sitemap或sitemap索引，返回 (子sitemap列表, 页面URL列表)"""
+        root = etree.fromstring(content, parser=etree.XMLParser(recover=True, resolve_entities=False))
+        sitemaps = []
+        pages = []
+        if root is None:
+            return sitemaps, pages
+        for loc in root.iter('{*}loc', 'loc'):
+            text = (loc.text or '').strip()
+            if not text:
+                continue
+            parent = loc.getparent()
+            if parent is not None and etree.QName(parent).localname == 'sitemap':
+                sitemaps.append(text)
+            else:
+                pages.append(text)
+        return sitemaps, pages
+
+    @staticmethod
+    def parse_listing(content, base_url, scope):
+        """解析分类列表页，返回 (产品链接, 范围内的列表/分页链接)"""
+        tree = lxml_html.fromstring(content)
+        host = urlparse(base_url).netloc
+        products = []
+        listings = []
+        for href in tree.xpath('//a/@href'):
+            link = urljoin(base_url, href.strip()).split('#', 1)[0]
+            parsed = urlparse(link)
+            if parsed.scheme not in ('http', 'https') or parsed.netloc != host:
+                continue
+            if extract_product_number(link):
+                products.append(link)
+            elif parsed.path.startswith(scope):
+                listings.append(link)
+        return products, listings
+
+    @staticmethod
+    def scope_for(url):
+        """分类入口的路径范围；以文件名结尾时取其所在目录"""
+        path = urlparse(url).path
+        if '.' in path.rsplit('/', 1)[-1]:
+            path = path.rsplit('/', 1)[0]
+        return path.rstrip('/') or '/'
+
+    def emit(self, url, feed, output):
+        """按规范产品编号去重后写入feed"""
+        key = canonical_key(url)
+        if key in self.seen_products:
+            self.duplicates += 1
+            return
+        self.seen_products.add(key)
+        self.found += 1
+        if output:
+            output.write(url + '\n')
+            output.flush()
+        feed.put(url)
+
+    def run(self, seeds, feed):
+        """广度优先遍历种子，发现的产品URL立即写入feed，结束时关闭feed"""
+        output = open(self.output_path, 'w', encoding='utf-8') if self.output_path else None
+        # 分类页只跟随种子路径下的链接 (子分类和分页)
+        pending = deque((seed, 0, self.scope_for(seed)) for seed in seeds)
+        try:
+            while pending and self.pages_fetched < self.max_pages and not feed.full():
+                url, depth, scope = pending.popleft()
+                if url in self.visited:
+                    continue
+                self.visited.add(url)
+                try:
+                    final_url, content = self.fetch(url)
+                except Exception as e:
+                    logger.warning(f"发现阶段获取失败 {url}: {e}")
+                    continue
+                self.pages_fetched += 1
+
+                if self.is_sitemap(url):
+                    sitemaps, pages = self.parse_sitemap(content)
+                    pending.extend((child, depth, scope) for child in sitemaps)
+                    for page in pages:
+                        if extract_product_number(page):
+                            self.emit(page, feed, output)
+                else:
+                    products, listings = self.parse_listing(content, final_url, scope)
+                    for product in products:
+                        self.emit(product, feed, output)
+                    if depth < self.max_depth:
+                        pending.extend((link, depth + 1, scope) for link in listings if link not in self.visited)
+        finally:
+            feed.close()
+            if output:
+                output.close()
+            logger.info(f"产品发现完成: 获取 {self.pages_fetched} 个页面, 发现 {self.found} 个产品, "
+                        f"重复 {self.duplicates} 个")
+
+    def start(self, seeds, feed):
+        """在后台线程运行发现，爬取可以同时开始"""
+        self.thread = threading.Thread(target=self.run, args=(seeds, feed), name='catalog-discovery', daemon=True)
+        self.thread.start()
+        return self.thread
+
+
 class OptimizedMultithreadedScraper:
-    def __init__(self, max_workers=2, headless=True):
+    def __init__(self, max_workers=2, headless=True, driver_max_pages=50, engine='selenium',
+                 ready_timeout=20, concurrency=100, rate=2.0, max_per_host=8, resource_blocker=None,
+                 chromedriver_path=None, max_attempts=3, retry_delay=10.0, driver_max_rss_mb=1024,
+                 host_memory_limit=90.0, replay=None):
         self.max_workers = max_workers
         self.headless = headless
-        self.products = []
+        self.engine = engine
+        self.concurrency = concurrency
+        self.static_hits = 0
+        self.browser_fallbacks = 0
+        self.product_count = 0
+        self.writer = None
+        self.write_excel = True
+        self.write_jsonl = False
+        self.run_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.url_list_suffix = ''
         self.failed_urls = []
         self.skipped_urls = []
         self.lock = threading.Lock()
@@ -50,36 +2201,345 @@ class OptimizedMultithreadedScraper:
         self.chrome_options.add_argument("--window-size=1920,1080")
         self.chrome_options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
         
+        # 浏览器请求屏蔽，与线程数无关
+        self.resource_blocker = resource_blocker if resource_blocker is not None else ResourceBlocker()
+
         # 快速检查session
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         })
+
+        # chromedriver路径每个进程只解析一次；指定本地路径时完全离线，回放模式不需要浏览器
+        self.chromedriver_path = chromedriver_path or os.environ.get('CHROMEDRIVER_PATH')
+        self.chromedriver_lock = threading.Lock()
+        if self.engine == 'selenium' and not replay:
+            try:
+                self.resolve_chromedriver()
+            except Exception as e:
+                logger.warning(f"解析chromedriver失败，将在创建浏览器时重试: {e}")
+
+        # 各阶段耗时统计
+        self.metrics = StageMetrics()
+        self.metrics_json = None
+        self.metrics_prom = None
+
+        # 浏览器进程树内存监控，单个浏览器超出预算时回收，主机内存紧张时暂停借出
+        self.memory_watchdog = None
+        if driver_max_rss_mb or host_memory_limit:
+            try:
+                self.memory_watchdog = BrowserMemoryWatchdog(driver_budget_mb=driver_max_rss_mb,
+                                                             host_limit_percent=host_memory_limit)
+            except RuntimeError as e:
+                logger.warning(f"未启用浏览器内存监控: {e}")
+
+        # 每个工作线程复用一个WebDriver，处理N个页面后回收
+        self.driver_pool = DriverPool(self.create_driver, size=max_workers, max_pages=driver_max_pages,
+                                      metrics=self.metrics, watchdog=self.memory_watchdog)
+
+        # 页面就绪检测
+        self.readiness = PageReadiness(timeout=ready_timeout)
+
+        # HEAD检查、静态请求和浏览器页面加载共用的限速器
+        self.rate_limiter = HostRateLimiter(rate=rate, max_in_flight=max_per_host)
+
+        # 断点续爬日志，由 open_journal() 打开
+        self.journal = None
+
+        # HTTP缓存，由 enable_http_cache() 启用
+        self.http_cache = None
+
+        # 页面录制/回放，由 enable_record() / enable_replay() 启用
+        self.page_store = None
+        self.replay = False
+
+        # 失败分类与退避重试
+        self.retry_scheduler = RetryScheduler(max_attempts=max_attempts, base_delay=retry_delay)
+
+        # 分布式任务队列，由 run_queue_worker() 使用；回报结果时带上当前线程租用任务的worker_id
+        self.job_queue = None
+        self.queue_local = threading.local()
+
+        # URL变体去重，由 collapse_urls() 填充
+        self.dedup_index = UrlDedupIndex()
+
+        # 预检结果，由 preflight() 填充，worker不再逐个发送HEAD
+        self.preflight_states = {}
+
+        # 并发自动调节，由 enable_autotune() 启用
+        self.tuner = None
+
+        # 增量模式，由 enable_incremental() 启用
+        self.previous_products = None
+        self.delta_writer = None
+        self.delta_counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'unknown': 0}
+        self.seen_urls = set()
+
+        if replay:
+            self.enable_replay(replay)
         
+    def enable_http_cache(self, directory, ttl=3600, max_bytes=1024 * 1024 * 1024):
+        """为HEAD检查和静态请求启用磁盘HTTP缓存"""
+        self.http_cache = HttpCache(directory, ttl=ttl, max_bytes=max_bytes)
+        adapter = CachingHTTPAdapter(self.http_cache)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        logger.info(f"HTTP缓存: {directory} (TTL {ttl}s)")
+
+    def enable_record(self, directory):
+        """把每个抓取到的页面最终HTML和响应头保存到目录"""
+        self.page_store = PageStore(directory)
+        logger.info(f"录制模式: 页面保存到 {directory}")
+
+    def enable_replay(self, directory):
+        """从录制目录读取页面，不访问网络也不启动浏览器"""
+        self.page_store = PageStore(directory)
+        self.replay = True
+        self.retry_scheduler = RetryScheduler(max_attempts=1)  # 回放结果是确定的，只统计失败类型不重试
+        self.driver_pool.driver_factory = lambda: ReplayDriver(self.page_store)
+        logger.info(f"回放模式: 从 {directory} 读取页面")
+
+    def enable_autotune(self, min_workers=1, interval=15.0, reserve_mb=1024):
+        """启用并发自动调节，-t 作为活跃worker数的上限"""
+        self.tuner = ConcurrencyTuner(self.max_workers, min_workers=min_workers, interval=interval,
+                                      reserve_mb=reserve_mb, rate_limiter=self.rate_limiter)
+        self.tuner.on_change(self.driver_pool.set_limit)
+
+    def active_workers(self):
+        """当前允许同时处理的URL数量"""
+        return self.tuner.limit if self.tuner else self.max_workers
+
+    def enable_incremental(self, previous_csv=None):
+        """启用增量模式：与上一次结果对比内容哈希，未变化的产品跳过详细提取"""
+        previous_csv = previous_csv or find_previous_results(self.output_prefix)
+        self.previous_products = {}
+        if previous_csv:
+            with open(previous_csv, 'r', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    self.previous_products[row['url']] = row
+            logger.info(f"增量模式: 对比上一次结果 {previous_csv} ({len(self.previous_products)} 个产品)")
+        else:
+            logger.info("增量模式: 没有找到上一次的结果，所有产品视为新增")
+        delta_path = f'{self.output_prefix}_delta_{self.run_timestamp}.csv'
+        self.delta_writer = StreamingResultWriter(delta_path, fieldnames=['change'] + PRODUCT_FIELDS)
+
+    def unchanged_product(self, url, content_hash):
+        """内容哈希与上一次相同时返回上一次的产品记录"""
+        if self.previous_products is None:
+            return None
+        previous = self.previous_products.get(url)
+        if previous and previous.get('content_hash') == content_hash:
+            return {field: previous.get(field, '') for field in PRODUCT_FIELDS}
+        return None
+
+    def track_change(self, product_info):
+        """对比上一次结果，把新增/变化的产品写入差异文件"""
+        if self.previous_products is None:
+            return
+        url = product_info['url']
+        previous = self.previous_products.get(url)
+        if previous is None:
+            change = 'new'
+        elif previous.get('content_hash') != product_info.get('content_hash'):
+            change = 'changed'
+        else:
+            change = 'unchanged'
+        with self.lock:
+            self.seen_urls.add(url)
+            self.delta_counts[change] += 1
+        if change != 'unchanged':
+            self.delta_writer.write(dict(product_info, change=change))
+
+    def close_delta(self):
+        """写入已下架的产品并关闭差异文件，返回差异文件路径
+
+        只有本次抓取返回404而被跳过的URL (含别名) 标记为removed；抓取失败的无法判断是否下架，
+        标记为unknown；本次没有抓取的URL (如 -n 限制、分片或发现结果之外) 不写入差异文件。
+        """
+        if self.delta_writer is None:
+            return None
+        skipped = set(self.skipped_urls)
+        failed = set(self.failed_urls)
+        for url, row in self.previous_products.items():
+            if url in self.seen_urls:
+                continue
+            if url in skipped:
+                change = 'removed'
+            elif url in failed:
+                change = 'unknown'
+            else:
+                continue
+            self.delta_counts[change] += 1
+            self.delta_writer.write(dict(row, change=change))
+        self.delta_writer.close()
+        logger.info(f"差异文件已保存: {self.delta_writer.csv_path} {self.delta_counts}")
+        return self.delta_writer.csv_path
+
+    def open_journal(self, path, resume=False):
+        """打开爬取日志；续爬时恢复已完成的结果，并返回已完成的URL集合"""
+        finished = set()
+        if resume:
+            entries = CrawlJournal.load(path)
+            for url, entry in entries.items():
+                if entry['status'] == 'ok' and entry.get('product'):
+                    # 已完成的产品直接写入本次的结果文件
+                    self.get_writer().write(entry['product'])
+                    self.track_change(entry['product'])
+                    self.product_count += 1
+                    finished.add(url)
+                elif entry['status'] == 'skipped':
+                    self.skipped_urls.append(url)
+                    finished.add(url)
+            retry_count = sum(1 for entry in entries.values() if entry['status'] == 'failed')
+            logger.info(f"从日志 {path} 恢复: 已完成 {len(finished)} 个, 待重试失败 {retry_count} 个")
+        self.journal = CrawlJournal(path, append=resume)
+        return finished
+
+    def get_writer(self):
+        """获取结果写入器，第一次写入时创建输出文件"""
+        with self.lock:
+            if self.writer is None:
+                csv_path = f'{self.output_prefix}_{self.run_timestamp}.csv'
+                jsonl_path = f'{self.output_prefix}_{self.run_timestamp}.jsonl' if self.write_jsonl else None
+                self.writer = StreamingResultWriter(csv_path, jsonl_path)
+                logger.info(f"结果实时写入: {csv_path}")
+            return self.writer
+
+    def collapse_urls(self, urls):
+        """抓取前折叠同一SKU的URL变体，返回需要抓取的URL"""
+        primaries = self.dedup_index.collapse(urls)
+        if len(primaries) < len(urls):
+            logger.info(f"URL去重: {len(urls)} 个URL折叠为 {len(primaries)} 个产品")
+        return primaries
+
+    def preflight(self, urls, concurrency=32, cache_path=None, ttl=86400):
+        """抓取前批量HEAD预检，返回去掉404/失效链接并解析重定向后的工作列表"""
+        checker = PreflightChecker(self.rate_limiter, headers=self.session.headers, concurrency=concurrency,
+                                   cache_path=cache_path, ttl=ttl)
+        with self.metrics.timer('preflight'):
+            results = checker.run(urls)
+
+        work = []
+        claimed = {}
+        counts = {'ok': 0, 'not_found': 0, 'dead': 0, 'error': 0, 'unknown': 0, 'redirected': 0}
+        for url in urls:
+            result = results[url]
+            state = result['state']
+            counts[state] += 1
+            if state == 'not_found':
+                self.record_skipped(url)
+                continue
+            if state == 'dead':
+                self.record_failed(url, requests.ConnectionError(result.get('error', '')), retry=False)
+                continue
+            target = result.get('final_url') or url
+            if target != url:
+                counts['redirected'] += 1
+            if target in claimed:
+                # 重定向后与另一个URL是同一页面，只抓取一次
+                self.dedup_index.merge(url, into=claimed[target])
+                continue
+            claimed[target] = url
+            if target != url:
+                self.dedup_index.redirect(url, target)
+            self.preflight_states[target] = state
+            work.append(target)
+
+        logger.info(f"预检完成: {counts}, 缓存命中 {checker.cache_hits} 个, 剩余 {len(work)} 个URL需要抓取")
+        return work
+
+    def record_product(self, product_info):
+        """记录成功提取的产品，并展开到同一SKU的所有别名URL"""
+        if self.retry_scheduler and has_product_data(product_info):
+            self.retry_scheduler.record_success(product_info['url'])
+        original = self.dedup_index.original_of(product_info['url'])
+        if original != product_info['url']:
+            product_info = alias_product(product_info, original)
+        aliases = self.dedup_index.aliases_of(product_info['url'])
+        for product in [product_info] + [alias_product(product_info, alias) for alias in aliases]:
+            self.get_writer().write(product)
+            self.track_change(product)
+            with self.lock:
+                self.product_count += 1
+                logger.info(f"进度: {self.product_count} 个产品已完成")
+            if self.journal:
+                self.journal.record(product['url'], 'ok', product=product)
+            if self.job_queue:
+                self.job_queue.report(product['url'], 'ok', self.queue_local.worker_id, product=product)
+
+    def record_skipped(self, url):
+        """记录跳过的404页面 (包括其别名URL)"""
+        url = self.dedup_index.original_of(url)
+        for skipped_url in [url] + self.dedup_index.aliases_of(url):
+            with self.lock:
+                self.skipped_urls.append(skipped_url)
+            if self.journal:
+                self.journal.record(skipped_url, 'skipped')
+            if self.job_queue:
+                self.job_queue.report(skipped_url, 'skipped', self.queue_local.worker_id)
+
+    def schedule_retry(self, url, failure_class):
+        """安排重试，成功安排时返回True"""
+        if not self.retry_scheduler:
+            return False
+        delay = self.retry_scheduler.schedule(url, failure_class)
+        if delay is None:
+            return False
+        logger.info(f"[{failure_class}] {delay:.0f}s 后重试: {url}")
+        return True
+
+    def record_failed(self, url, error='', retry=True):
+        """记录失败的URL；仍有重试预算时改为安排重试"""
+        failure_class = classify_failure(error)
+        if self.tuner:
+            self.tuner.observe_failure()
+        if retry and self.schedule_retry(url, failure_class):
+            return
+        url = self.dedup_index.original_of(url)
+        for failed_url in [url] + self.dedup_index.aliases_of(url):
+            with self.lock:
+                self.failed_urls.append(failed_url)
+            if self.journal:
+                self.journal.record(failed_url, 'failed', error=f'[{failure_class}] {error}')
+            if self.job_queue:
+                self.job_queue.report(failed_url, 'failed', self.queue_local.worker_id, error=f'[{failure_class}] {error}')
+
+    def resolve_chromedriver(self):
+        """返回chromedriver路径，首次调用时解析并缓存"""
+        with self.chromedriver_lock:
+            if self.chromedriver_path:
+                if not os.path.isfile(self.chromedriver_path):
+                    raise FileNotFoundError(f"chromedriver不存在: {self.chromedriver_path}")
+            else:
+                self.chromedriver_path = ChromeDriverManager().install()
+                logger.info(f"chromedriver已解析: {self.chromedriver_path}")
+            return self.chromedriver_path
+
     def create_driver(self):
         """为每个线程创建独立的WebDriver实例"""
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                service = Service(ChromeDriverManager().install())
+                service = Service(self.resolve_chromedriver())
 
                 # 为高线程数添加额外的Chrome选项
                 options = Options()
                 for arg in self.chrome_options.arguments:
                     options.add_argument(arg)
 
-                # 高线程数时的额外优化
+                # 高线程数时的额外优化 (图片等资源统一由ResourceBlocker屏蔽)
                 if self.max_workers > 8:
                     options.add_argument("--disable-extensions")
                     options.add_argument("--disable-plugins")
-                    options.add_argument("--disable-images")
-                    options.add_argument("--disable-javascript")  # 可能影响数据提取
-                    options.add_argument("--memory-pressure-off")
                     options.add_argument("--max_old_space_size=4096")
 
                 driver = webdriver.Chrome(service=service, options=options)
                 driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
                 driver.set_page_load_timeout(30)
+                try:
+                    self.resource_blocker.apply(driver)
+                except Exception as e:
+                    logger.warning(f"启用资源屏蔽失败: {e}")
                 return driver
 
             except Exception as e:
@@ -90,8 +2550,17 @@ class OptimizedMultithreadedScraper:
     
     def quick_check_page_status(self, url):
         """快速检查页面状态"""
+        if url in self.preflight_states:
+            state = self.preflight_states[url]
+            return state if state in ('ok', 'error') else 'unknown'
+        if self.replay:
+            meta = self.page_store.load_meta(url)
+            if meta is None:
+                return 'unknown'
+            return 'not_found' if meta['status'] == 404 else 'ok'
         try:
-            response = self.session.head(url, timeout=5, allow_redirects=True)
+            with self.metrics.timer('head_check'):
+                response = self.limited_request('head', url, timeout=5, allow_redirects=True)
             if response.status_code == 404:
                 return 'not_found'
             elif response.status_code >= 400:
@@ -103,106 +2572,167 @@ class OptimizedMultithreadedScraper:
         except:
             return 'unknown'
     
-    def extract_product_info_optimized(self, url):
+    def limited_request(self, method, url, **kwargs):
+        """经过限速器发送HTTP请求"""
+        # 缓存仍然新鲜时不会访问网络，不占用限速名额
+        if self.http_cache and self.http_cache.has_fresh(method, url):
+            return self.session.request(method.upper(), url, **kwargs)
+
+        self.rate_limiter.acquire(url)
+        start = time.monotonic()
+        status = retry_after = None
+        try:
+            response = self.session.request(method.upper(), url, **kwargs)
+            status = response.status_code
+            retry_after = HostRateLimiter.parse_retry_after(response.headers.get('Retry-After'))
+            return response
+        finally:
+            self.rate_limiter.release(url, status, time.monotonic() - start, retry_after)
+
+    def fetch_static_html(self, url):
+        """用requests获取页面HTML，返回(状态码, HTML)"""
+        if self.replay:
+            meta, page_html = self.page_store.load(url)
+            return meta['status'], page_html
+        response = self.limited_request('get', url, timeout=15)
+        if self.page_store:
+            self.page_store.save(url, response.status_code, response.text, headers=response.headers,
+                                 final_url=response.url)
+        return response.status_code, response.text
+
+    def extract_product_info_static(self, url):
+        """静态HTML快速提取，缺少关键字段时回退到Selenium"""
+        thread_id = threading.current_thread().ident
+        logger.info(f"[线程{thread_id}] 静态处理: {url}")
+
+        try:
+            with self.metrics.timer('static_fetch'):
+                status_code, page_html = self.fetch_static_html(url)
+            if status_code == 404:
+                logger.info(f"[线程{thread_id}] 静态请求检测到404页面: {url}")
+                self.record_skipped(url)
+                return None
+            if status_code >= 500:
+                self.record_failed(url, HttpStatusError(status_code, url))
+                return None
+
+            if status_code == 200:
+                with self.metrics.timer('static_parse'):
+                    product_info = parse_product_html(page_html, url)
+                if product_info is None:
+                    logger.info(f"[线程{thread_id}] 静态HTML检测到404页面: {url}")
+                    self.record_skipped(url)
+                    return None
+                if has_core_fields(product_info):
+                    logger.info(f"[线程{thread_id}] ✅ 静态提取成功: {product_info['name']} ({product_info['product_number']})")
+                    with self.lock:
+                        self.static_hits += 1
+                    return product_info
+        except Exception as e:
+            logger.warning(f"[线程{thread_id}] 静态提取失败 {url}: {e}")
+
+        logger.info(f"[线程{thread_id}] 静态HTML缺少字段，回退到Selenium: {url}")
+        with self.lock:
+            self.browser_fallbacks += 1
+        return self.extract_product_info_optimized(url, check_status=False)
+
+    def extract_product_info_optimized(self, url, check_status=True):
         """优化的产品信息提取"""
         thread_id = threading.current_thread().ident
         logger.info(f"[线程{thread_id}] 处理: {url}")
         
-        # 快速检查页面状态
-        status = self.quick_check_page_status(url)
+        # 快速检查页面状态 (调用方已确认状态时跳过)
+        status = self.quick_check_page_status(url) if check_status else 'ok'
         if status == 'not_found':
             logger.info(f"[线程{thread_id}] 快速跳过404页面: {url}")
-            with self.lock:
-                self.skipped_urls.append(url)
+            if self.page_store and not self.replay:
+                self.page_store.save(url, 404, '', source='head')
+            self.record_skipped(url)
             return None
         
-        driver = self.create_driver()
+        with self.metrics.timer('driver_checkout'):
+            driver = self.driver_pool.checkout()
+        driver_broken = False
         
         try:
-            # 根据线程数动态调整延迟
-            if self.max_workers > 16:
-                initial_delay = random.uniform(8, 15)  # 高线程数时更长延迟
-            elif self.max_workers > 8:
-                initial_delay = random.uniform(5, 10)
+            if self.replay:
+                with self.metrics.timer('page_load'):
+                    driver.get(url)
             else:
-                initial_delay = random.uniform(3, 6)
-
-            driver.get(url)
-            time.sleep(initial_delay)
+                self.rate_limiter.acquire(url)
+                load_start = time.monotonic()
+                try:
+                    driver.get(url)
+                finally:
+                    load_elapsed = time.monotonic() - load_start
+                    self.metrics.observe('page_load', load_elapsed)
+                    self.rate_limiter.release(url, elapsed=load_elapsed)
 
-            # 等待页面完全加载
-            WebDriverWait(driver, 30).until(
-                lambda d: d.execute_script("return document.readyState") == "complete"
-            )
+            # 等待详情渲染完成或DOM/网络静默 (回放的页面已是最终HTML)
+            if self.replay:
+                reason, elapsed = 'replay', 0.0
+            else:
+                reason, elapsed = self.readiness.wait(driver)
+                self.metrics.observe('ready_wait', elapsed)
+            if reason == 'timeout':
+                logger.warning(f"[线程{thread_id}] 等待页面就绪超时 ({elapsed:.1f}s)，继续尝试提取")
+            else:
+                logger.info(f"[线程{thread_id}] 页面就绪 ({reason}, {elapsed:.2f}s)")
+            
+            # 一次往返取回标题、名称候选、详情行和图片
+            with self.metrics.timer('snapshot'):
+                snapshot = self.extract_page_snapshot(driver)
 
-            # 等待React/JavaScript内容加载
-            time.sleep(8)  # 增加等待时间让动态内容加载
+            if self.page_store and not self.replay:
+                status_code = 404 if is_not_found_title(snapshot['title']) else 200
+                self.page_store.save(url, status_code, driver.page_source,
+                                     final_url=snapshot['url'], source='browser')
 
-            # 尝试等待特定元素出现
-            try:
-                WebDriverWait(driver, 10).until(
-                    EC.any_of(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, ".Details_customHorizontal")),
-                        EC.presence_of_element_located((By.CSS_SELECTOR, ".Details_customVertical")),
-                        EC.presence_of_element_located((By.CSS_SELECTOR, "h1"))
-                    )
-                )
-                time.sleep(3)  # 额外等待确保内容完全加载
-            except TimeoutException:
-                logger.warning(f"[线程{thread_id}] 等待页面元素超时，继续尝试提取")
-            
             # 检查404页面
-            page_title = driver.title.lower()
-            if 'not found' in page_title or 'page cannot be found' in page_title:
+            if is_not_found_title(snapshot['title']):
                 logger.info(f"[线程{thread_id}] Selenium检测到404页面: {url}")
-                with self.lock:
-                    self.skipped_urls.append(url)
+                self.record_skipped(url)
                 return None
             
-            product_info = {
-                'url': url,
-                'name': '',
-                'product_number': '',
-                'cas_labeled': '',
-                'cas_unlabeled': '',
-                'synonyms': '',
-                'formula': '',
-                'molecular_weight': '',
-                'isotopic_enrichment': '',
-                'chemical_purity': '',
-                'description': '',
-                'image_url': '',
-                'page_title': driver.title
-            }
+            # 增量模式: 详情区域未变化时直接复用上一次的结果
+            content_hash = content_hash_from_parts(
+                snapshot['headings'], snapshot['detail_blocks'], snapshot['images'])
+            previous = self.unchanged_product(url, content_hash)
+            if previous:
+                logger.info(f"[线程{thread_id}] 内容未变化，跳过详细提取: {url}")
+                return previous
+
+            product_info = new_product_info(url, snapshot['title'])
+            product_info['content_hash'] = content_hash
             
             # 提取基本信息
-            product_info['name'] = self.extract_product_name(driver)
+            with self.metrics.timer('extract_name'):
+                product_info['name'] = self.extract_product_name(driver, snapshot)
             product_info['product_number'] = self.extract_product_number(url)
-            product_info['image_url'] = self.extract_product_image(driver)
-            
-            # 等待动态内容加载
-            time.sleep(2)
+            with self.metrics.timer('extract_image'):
+                product_info['image_url'] = self.extract_product_image(driver, snapshot)
             
             # 提取详细信息 - 使用多种方法
-            self.extract_details_comprehensive(driver, product_info)
+            self.extract_details_comprehensive(driver, product_info, snapshot)
 
             # 调试信息：显示页面内容
-            logger.info(f"[线程{thread_id}] 页面标题: {driver.title}")
-            logger.info(f"[线程{thread_id}] 页面URL: {driver.current_url}")
-
-            # 检查页面是否包含产品详情元素
-            details_elements = driver.find_elements(By.CSS_SELECTOR, ".Details_customHorizontal, .Details_customVertical")
-            logger.info(f"[线程{thread_id}] 找到 {len(details_elements)} 个详情元素")
+            logger.info(f"[线程{thread_id}] 页面标题: {snapshot['title']}")
+            logger.info(f"[线程{thread_id}] 页面URL: {snapshot['url']}")
+            logger.info(f"[线程{thread_id}] 找到 {len(snapshot['detail_blocks'])} 个详情元素")
 
             # 验证提取结果
-            if product_info['name'] or product_info['cas_labeled'] or product_info['formula']:
+            if has_product_data(product_info):
                 logger.info(f"[线程{thread_id}] ✅ 成功提取: {product_info['name']} ({product_info['product_number']})")
                 logger.info(f"[线程{thread_id}]   CAS: {product_info['cas_labeled']} / {product_info['cas_unlabeled']}")
                 logger.info(f"[线程{thread_id}]   分子式: {product_info['formula']}")
                 return product_info
             else:
                 logger.warning(f"[线程{thread_id}] ⚠️  提取的数据为空: {url}")
-                logger.warning(f"[线程{thread_id}]   页面标题: {driver.title}")
+                logger.warning(f"[线程{thread_id}]   页面标题: {snapshot['title']}")
+
+                # 页面可能还没渲染完成，预算内重新排队
+                if self.schedule_retry(url, 'empty_extraction'):
+                    return None
 
                 # 保存页面源码用于调试
                 try:
@@ -216,282 +2746,645 @@ class OptimizedMultithreadedScraper:
             
         except Exception as e:
             logger.error(f"[线程{thread_id}] 提取失败 {url}: {e}")
-            with self.lock:
-                self.failed_urls.append(url)
+            driver_broken = not self.driver_pool.is_healthy(driver)
+            self.record_failed(url, 'driver_crash' if driver_broken else e)
             return None
         
         finally:
-            driver.quit()
+            self.driver_pool.checkin(driver, broken=driver_broken)
     
-    def extract_product_name(self, driver):
+    def extract_page_snapshot(self, driver):
+        """通过一次execute_script取回提取所需的全部页面数据"""
+        snapshot = driver.execute_script(EXTRACT_PAGE_JS, NAME_SELECTORS) or {}
+        for key in ('names', 'headings', 'details', 'detail_blocks', 'images'):
+            snapshot.setdefault(key, [])
+        snapshot.setdefault('title', '')
+        snapshot.setdefault('url', '')
+        return snapshot
+
+    def extract_product_name(self, driver, snapshot=None):
         """提取产品名称"""
-        name_selectors = [
-            'h1',
-            '.product-title',
-            '.product-name',
-            '.page-title',
-            '.entry-title',
-            '[data-testid="product-name"]'
-        ]
-        
-        for selector in name_selectors:
-            try:
-                elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                for element in elements:
-                    text = element.text.strip()
-                    if text and len(text) > 3 and 'Cambridge Isotope' not in text and 'not found' not in text.lower():
-                        return text
-            except:
-                continue
-        
-        # 从页面标题提取
-        try:
-            title = driver.title
-            if title and 'Cambridge Isotope' in title and 'not found' not in title.lower():
-                # 提取产品名称部分
-                name_match = re.search(r'^([^-]+)', title)
-                if name_match:
-                    name = name_match.group(1).strip()
-                    if len(name) > 3:
-                        return name
-        except:
-            pass
-        
-        return ''
+        try:
+            snapshot = snapshot or self.extract_page_snapshot(driver)
+            return pick_product_name(snapshot['names'], snapshot['title'])
+        except Exception:
+            return ''
     
     def extract_product_number(self, url):
         """从URL提取产品编号"""
-        patterns = [
-            r'([cdno]lm-\d+(?:-[a-z0-9]+)?)',
-            r'itemno=([A-Z0-9-]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url, re.IGNORECASE)
-            if match:
-                return match.group(1).upper()
-        
-        return ''
+        return extract_product_number(url)
     
-    def extract_product_image(self, driver):
+    def extract_product_image(self, driver, snapshot=None):
         """提取产品图片URL"""
         try:
-            # 等待图片加载
-            time.sleep(1)
-            
-            image_selectors = [
-                'img[src*="/product/image/"]',
-                'img[src*="cdlm-"]',
-                'img[src*="clm-"]',
-                'img[src*="dlm-"]',
-                'img[src*="nlm-"]',
-                'img[src*="olm-"]',
-                '.product-image img',
-                '.product-photo img'
-            ]
-            
-            for selector in image_selectors:
-                try:
-                    elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                    for element in elements:
-                        src = element.get_attribute('src')
-                        if src and '/product/image/' in src:
-                            if src.startswith('/'):
-                                src = 'https://isotope.com' + src
-                            return src
-                except:
-                    continue
-        except:
-            pass
-        
-        return ''
+            snapshot = snapshot or self.extract_page_snapshot(driver)
+            return pick_image_url(snapshot['images'], snapshot['url'] or 'https://isotope.com')
+        except Exception:
+            return ''
     
-    def extract_details_comprehensive(self, driver, product_info):
+    def extract_details_comprehensive(self, driver, product_info, snapshot=None):
         """综合提取详细信息"""
         try:
-            # 方法1: CSS选择器提取
-            self.extract_details_by_css(driver, product_info)
+            # 方法1: 批量JS提取的详情行
+            with self.metrics.timer('extract_details_css'):
+                self.extract_details_by_css(driver, product_info, snapshot)
             
-            # 方法2: 如果CSS方法没有获取到主要信息，使用页面源码提取
+            # 方法2: 如果没有获取到主要信息，使用页面源码提取
             if not product_info['cas_labeled'] and not product_info['cas_unlabeled']:
-                self.extract_details_from_source(driver, product_info)
+                with self.metrics.timer('extract_details_source'):
+                    self.extract_details_from_source(driver, product_info)
             
-            # 方法3: 尝试等待并重新提取
-            if not product_info['cas_labeled'] and not product_info['formula']:
-                time.sleep(2)
-                self.extract_details_by_css(driver, product_info)
+            # 方法3: 等待详情行出现后重新提取
+            if not product_info['cas_labeled'] and not product_info['formula'] and not self.replay:
+                reason, elapsed = self.readiness.wait(driver, timeout=2, require_details=True)
+                self.metrics.observe('details_wait', elapsed)
+                if reason == 'details':
+                    with self.metrics.timer('extract_details_css'):
+                        self.extract_details_by_css(driver, product_info)
         
         except Exception as e:
             logger.warning(f"详细信息提取失败: {e}")
     
-    def extract_details_by_css(self, driver, product_info):
-        """使用CSS选择器提取详细信息"""
+    def extract_details_by_css(self, driver, product_info, snapshot=None):
+        """把详情行 (.Details_name 与第二个span) 映射到产品字段"""
         thread_id = threading.current_thread().ident
         extracted_count = 0
 
         try:
-            detail_selectors = ['.Details_customHorizontal', '.Details_customVertical']
-
-            for selector in detail_selectors:
-                try:
-                    elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                    logger.info(f"[线程{thread_id}] 找到 {len(elements)} 个 {selector} 元素")
-
-                    for i, element in enumerate(elements):
-                        try:
-                            name_element = element.find_element(By.CSS_SELECTOR, '.Details_name')
-                            name = name_element.text.strip().lower()
-
-                            spans = element.find_elements(By.TAG_NAME, 'span')
-                            if len(spans) >= 2:
-                                value = spans[1].text.strip()
-                                logger.info(f"[线程{thread_id}] 元素{i}: '{name}' = '{value}'")
-
-                                if 'cas number labeled' in name:
-                                    product_info['cas_labeled'] = value
-                                    extracted_count += 1
-                                elif 'cas number unlabeled' in name:
-                                    product_info['cas_unlabeled'] = value
-                                    extracted_count += 1
-                                elif 'formula' in name:
-                                    product_info['formula'] = value
-                                    extracted_count += 1
-                                elif 'synonyms' in name and not product_info['synonyms']:
-                                    product_info['synonyms'] = value
-                                    extracted_count += 1
-                                elif 'molecular weight' in name:
-                                    product_info['molecular_weight'] = value
-                                    extracted_count += 1
-                                elif 'enrichment' in name:
-                                    product_info['isotopic_enrichment'] = value
-                                    extracted_count += 1
-                                elif 'purity' in name:
-                                    product_info['chemical_purity'] = value
-                                    extracted_count += 1
-                            else:
-                                logger.warning(f"[线程{thread_id}] 元素{i}没有足够的span: {len(spans)}")
-                        except Exception as e:
-                            logger.warning(f"[线程{thread_id}] 处理元素{i}失败: {e}")
-                            continue
-                except Exception as e:
-                    logger.warning(f"[线程{thread_id}] 查找{selector}失败: {e}")
-                    continue
+            snapshot = snapshot or self.extract_page_snapshot(driver)
+            for i, (name, value) in enumerate(snapshot['details']):
+                name = name.strip().lower()
+                value = value.strip()
+                logger.info(f"[线程{thread_id}] 元素{i}: '{name}' = '{value}'")
+                if apply_detail_field(product_info, name, value):
+                    extracted_count += 1
 
-            logger.info(f"[线程{thread_id}] CSS提取完成，共提取 {extracted_count} 个字段")
+            logger.info(f"[线程{thread_id}] 详情提取完成，共提取 {extracted_count} 个字段")
 
         except Exception as e:
-            logger.error(f"[线程{thread_id}] CSS提取总体失败: {e}")
+            logger.error(f"[线程{thread_id}] 详情提取总体失败: {e}")
     
     def extract_details_from_source(self, driver, product_info):
-        """从页面源码提取详细信息"""
+        """从页面源码提取详细信息 (单次扫描，只填充空字段)"""
         try:
-            page_source = driver.page_source
-            
-            # CAS号提取
-            cas_patterns = [
-                (r'>CAS Number Labeled</span><span>(\d{1,7}-\d{2}-\d)</span>', 'labeled'),
-                (r'>CAS Number Unlabeled</span><span>(\d{1,7}-\d{2}-\d)</span>', 'unlabeled'),
-                (r'CAS\s*Number\s*Labeled[:\s]*(\d{1,7}-\d{2}-\d)', 'labeled'),
-                (r'CAS\s*Number\s*Unlabeled[:\s]*(\d{1,7}-\d{2}-\d)', 'unlabeled'),
-            ]
-            
-            for pattern, cas_type in cas_patterns:
-                matches = re.findall(pattern, page_source, re.IGNORECASE)
-                if matches:
-                    if cas_type == 'labeled':
-                        product_info['cas_labeled'] = matches[0]
-                    elif cas_type == 'unlabeled':
-                        product_info['cas_unlabeled'] = matches[0]
-            
-            # 分子式提取
-            formula_patterns = [
-                r'>Formula</span><span>([^<]+)</span>',
-                r'Formula[:\s]*([A-Z][a-z]?(?:\d+)?(?:[A-Z*][a-z]?(?:\d+)?)*)',
-            ]
-            
-            for pattern in formula_patterns:
-                matches = re.findall(pattern, page_source, re.IGNORECASE)
-                if matches:
-                    product_info['formula'] = matches[0].strip()
-                    break
+            fill_missing_fields(product_info, parse_source_details(driver.page_source))
         except:
             pass
     
-    def scrape_products_multithreaded(self, urls, max_products=None):
-        """多线程爬取产品"""
-        if max_products:
-            urls = urls[:max_products]
-        
-        logger.info(f"开始多线程爬取 {len(urls)} 个产品，使用 {self.max_workers} 个线程")
-        
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_url = {executor.submit(self.extract_product_info_optimized, url): url for url in urls}
-            
-            for future in as_completed(future_to_url):
-                url = future_to_url[future]
+    def process_url(self, url):
+        """按引擎处理单个URL，并记录整体耗时"""
+        worker = self.extract_product_info_static if self.engine == 'static' else self.extract_product_info_optimized
+        start = time.perf_counter()
+        try:
+            with self.metrics.timer('url_total'):
+                return worker(url)
+        finally:
+            if self.tuner:
+                self.tuner.observe(time.perf_counter() - start)
+
+    def run_queue_worker(self, job_queue, lease_seconds=300, worker_name=None):
+        """从任务队列租用URL直到队列清空，每个线程独立拉取任务"""
+        self.job_queue = job_queue
+        self.retry_scheduler = None  # 重试由队列的尝试次数负责
+        worker_name = worker_name or f'{socket.gethostname()}-{os.getpid()}'
+        worker = self.process_url
+        logger.info(f"队列worker {worker_name} 启动: {self.max_workers} 个线程, 租约 {lease_seconds}s")
+
+        def pull_loop(thread_index):
+            worker_id = f'{worker_name}-{thread_index}'
+            self.queue_local.worker_id = worker_id
+            while True:
+                if thread_index >= self.active_workers():
+                    # 自动调节下调了上限，多出的线程暂停拉取
+                    if job_queue.is_drained():
+                        return
+                    time.sleep(1)
+                    continue
+                job = job_queue.lease(worker_id, lease_seconds)
+                if job is None:
+                    if job_queue.is_drained():
+                        return
+                    time.sleep(1)  # 其他worker仍持有租约，等待其完成或过期
+                    continue
+                url = job['url']
                 try:
-                    result = future.result()
+                    result = worker(url)
                     if result:
-                        with self.lock:
-                            self.products.append(result)
-                            logger.info(f"进度: {len(self.products)} 个产品已完成")
+                        self.record_product(result)
                 except Exception as e:
                     logger.error(f"处理 {url} 时出错: {e}")
-                    with self.lock:
-                        self.failed_urls.append(url)
+                    self.record_failed(url, e)
+
+        if self.tuner:
+            self.tuner.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for future in [executor.submit(pull_loop, index) for index in range(self.max_workers)]:
+                    future.result()
+        finally:
+            if self.tuner:
+                self.tuner.stop()
+            self.driver_pool.close()
+            if self.journal:
+                self.journal.close()
+            self.log_summary()
+            logger.info(f"队列状态: {job_queue.stats()}")
+
+    def scrape_products_multithreaded(self, urls, max_products=None):
+        """多线程爬取产品，urls可以是列表，也可以是边发现边写入的UrlFeed"""
+        feed = urls if isinstance(urls, UrlFeed) else UrlFeed.from_urls(urls, limit=max_products)
         
+        if feed.exhausted():
+            logger.info(f"开始多线程爬取 {feed.accepted} 个产品，使用 {self.max_workers} 个线程 (引擎: {self.engine})")
+        else:
+            logger.info(f"开始多线程爬取 (URL边发现边爬取)，使用 {self.max_workers} 个线程 (引擎: {self.engine})")
+
+        worker = self.process_url
+        if self.tuner:
+            self.tuner.start()
+        
+        try:
+            if self.engine == 'async':
+                AsyncCrawlEngine(self, concurrency=self.concurrency).run(feed)
+                return
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                future_to_url = {}
+                
+                while True:
+                    # 在途任务数有上限，URL流可以任意长；自动调节时上限即活跃worker数
+                    max_in_flight = self.tuner.limit if self.tuner else self.max_workers * 2
+                    # 到期的重试排在队尾
+                    for url in self.retry_scheduler.pop_due():
+                        future_to_url[executor.submit(worker, url)] = url
+                    for url in feed.take(max_in_flight - len(future_to_url)):
+                        future_to_url[executor.submit(worker, url)] = url
+                    if not future_to_url:
+                        if feed.exhausted() and not self.retry_scheduler.pending():
+                            break
+                        feed.wait(timeout=self.retry_scheduler.next_due_in())
+                        continue
+
+                    timeout = self.retry_scheduler.next_due_in()
+                    if not feed.exhausted():
+                        timeout = min(timeout, 0.5) if timeout is not None else 0.5
+                    done, _ = wait(future_to_url, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        url = future_to_url.pop(future)
+                        try:
+                            result = future.result()
+                            if result:
+                                self.record_product(result)
+                        except Exception as e:
+                            logger.error(f"处理 {url} 时出错: {e}")
+                            self.record_failed(url, e)
+        finally:
+            if self.tuner:
+                self.tuner.stop()
+            self.driver_pool.close()
+            if self.journal:
+                self.journal.close()
+            self.log_summary()
+
+    def log_summary(self):
+        """输出爬取统计日志"""
         logger.info(f"多线程爬取完成！")
-        logger.info(f"成功: {len(self.products)} 个")
+        logger.info(f"成功: {self.product_count} 个")
         logger.info(f"跳过: {len(self.skipped_urls)} 个")
         logger.info(f"失败: {len(self.failed_urls)} 个")
+        if self.engine in ('static', 'async'):
+            logger.info(f"静态提取: {self.static_hits} 个, 回退Selenium: {self.browser_fallbacks} 个")
+        if self.readiness.waits:
+            logger.info(f"页面就绪等待: {self.readiness.summary()}")
+        logger.info(f"限速器: {self.rate_limiter.summary()}")
+        if self.retry_scheduler and self.retry_scheduler.summary():
+            logger.info(f"失败分类与重试: {self.retry_scheduler.summary()}")
+        if self.http_cache:
+            logger.info(f"HTTP缓存: {self.http_cache.summary()}")
+        if self.page_store:
+            logger.info(f"页面存档: {self.page_store.summary()}")
+        if self.dedup_index.summary()['aliases']:
+            logger.info(f"URL去重: {self.dedup_index.summary()}")
+        if self.tuner:
+            summary = self.tuner.summary()
+            logger.info(f"自动调节: 最终 {summary['limit']} 个worker, 峰值 {summary['peak']}, 调整 {summary['adjustments']} 次")
+        self.metrics.log_report()
+        self.export_metrics()
+
+    def export_metrics(self):
+        """按配置写出JSON报告和Prometheus文件"""
+        if self.metrics_json:
+            self.metrics.write_json(self.metrics_json, extra={
+                'engine': self.engine,
+                'max_workers': self.max_workers,
+                'products': self.product_count,
+                'skipped': len(self.skipped_urls),
+                'failed': len(self.failed_urls),
+                'autotune': self.tuner.summary() if self.tuner else None,
+            })
+            logger.info(f"阶段耗时报告已保存: {self.metrics_json}")
+        if self.metrics_prom:
+            self.metrics.write_prometheus(self.metrics_prom)
     
     def save_results(self):
-        """保存结果"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        """关闭结果文件，生成Excel并输出统计"""
+        timestamp = self.run_timestamp
+        csv_filename = excel_filename = None
         
-        if self.products:
-            # 保存为CSV
-            csv_filename = f'{self.output_prefix}_{timestamp}.csv'
-            df = pd.DataFrame(self.products)
-            df.to_csv(csv_filename, index=False, encoding='utf-8')
+        if self.writer:
+            self.writer.close()
+            csv_filename = self.writer.csv_path
             logger.info(f"CSV文件已保存: {csv_filename}")
+            if self.writer.jsonl_path:
+                logger.info(f"JSONL文件已保存: {self.writer.jsonl_path}")
 
-            # 保存为Excel
-            excel_filename = f'{self.output_prefix}_{timestamp}.xlsx'
-            df.to_excel(excel_filename, index=False, engine='openpyxl')
-            logger.info(f"Excel文件已保存: {excel_filename}")
+            # 后处理: 从CSV流式生成Excel
+            if self.write_excel and self.writer.count:
+                excel_filename = f'{self.output_prefix}_{timestamp}.xlsx'
+                convert_csv_to_xlsx(csv_filename, excel_filename)
+                logger.info(f"Excel文件已保存: {excel_filename}")
         
+        self.close_delta()
+
         # 保存跳过和失败的URL
         if self.skipped_urls:
-            with open(f'skipped_urls_{timestamp}.txt', 'w', encoding='utf-8') as f:
+            with open(f'skipped_urls_{timestamp}{self.url_list_suffix}.txt', 'w', encoding='utf-8') as f:
                 for url in self.skipped_urls:
                     f.write(url + '\n')
         
         if self.failed_urls:
-            with open(f'failed_urls_{timestamp}.txt', 'w', encoding='utf-8') as f:
+            with open(f'failed_urls_{timestamp}{self.url_list_suffix}.txt', 'w', encoding='utf-8') as f:
                 for url in self.failed_urls:
                     f.write(url + '\n')
         
         # 显示统计信息
         print(f"\n=== 优化多线程爬取结果 ===")
-        print(f"总处理数量: {len(self.products) + len(self.skipped_urls) + len(self.failed_urls)}")
-        print(f"成功获取: {len(self.products)}")
+        print(f"总处理数量: {self.product_count + len(self.skipped_urls) + len(self.failed_urls)}")
+        print(f"成功获取: {self.product_count}")
         print(f"跳过404页面: {len(self.skipped_urls)}")
         print(f"失败: {len(self.failed_urls)}")
+
+        retry_stats = self.retry_scheduler.summary() if self.retry_scheduler else {}
+        if retry_stats:
+            print(f"\n失败分类 (失败次数 / 重试 / 重试成功 / 放弃):")
+            for name, stats in retry_stats.items():
+                print(f"{name}: {stats['failures']} / {stats['retried']} / {stats['recovered']} / {stats['gave_up']}")
         
-        if self.products:
-            df = pd.DataFrame(self.products)
+        if self.writer and self.writer.count:
+            filled = self.writer.filled
             print(f"\n数据质量:")
-            print(f"有产品名称: {len(df[df['name'] != ''])}")
-            print(f"有CAS Labeled: {len(df[df['cas_labeled'] != ''])}")
-            print(f"有CAS Unlabeled: {len(df[df['cas_unlabeled'] != ''])}")
-            print(f"有分子式: {len(df[df['formula'] != ''])}")
-            print(f"有图片: {len(df[df['image_url'] != ''])}")
+            print(f"有产品名称: {filled['name']}")
+            print(f"有CAS Labeled: {filled['cas_labeled']}")
+            print(f"有CAS Unlabeled: {filled['cas_unlabeled']}")
+            print(f"有分子式: {filled['formula']}")
+            print(f"有图片: {filled['image_url']}")
             
             return csv_filename, excel_filename
         
         return None, None
 
+class AsyncCrawlEngine:
+    """asyncio + aiohttp 并发抓取引擎
+
+    所有页面的状态检查和静态HTML获取在单个事件循环中并发完成，
+    只有静态HTML缺少关键字段的页面才交给小规模的浏览器线程池渲染。
+    """
+
+    def __init__(self, scraper, concurrency=100):
+        self.scraper = scraper
+        self.concurrency = concurrency
+        self.browser_executor = None
+
+    def run(self, feed):
+        """同步入口：运行事件循环直到全部URL处理完毕"""
+        asyncio.run(self.crawl(feed))
+
+    async def crawl(self, feed):
+        try:
+            import aiohttp
+        except ImportError:
+            raise RuntimeError("async引擎需要aiohttp，请执行: pip install aiohttp")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # 每主机并发上限与线程模式共用同一配置
+        connector = aiohttp.TCPConnector(limit=self.concurrency,
+                                         limit_per_host=self.scraper.rate_limiter.max_in_flight,
+                                         ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=30)
+        # 浏览器线程数与 -t 一致，和WebDriver池大小相同
+        self.browser_executor = ThreadPoolExecutor(max_workers=self.scraper.max_workers)
+
+        logger.info(f"async引擎: 最多 {self.concurrency} 个并发请求, {self.scraper.max_workers} 个浏览器线程")
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                             headers=dict(self.scraper.session.headers)) as session:
+                retry_scheduler = self.scraper.retry_scheduler
+                max_pending = self.concurrency * 2
+                pending = set()
+                while True:
+                    for url in retry_scheduler.pop_due():
+                        pending.add(asyncio.create_task(self.process(session, semaphore, url)))
+                    for url in feed.take(max_pending - len(pending)):
+                        pending.add(asyncio.create_task(self.process(session, semaphore, url)))
+                    if not pending:
+                        if feed.exhausted() and not retry_scheduler.pending():
+                            break
+                        await asyncio.sleep(min(retry_scheduler.next_due_in() or 0.2, 0.2))
+                        continue
+                    timeout = retry_scheduler.next_due_in()
+                    if not feed.exhausted():
+                        timeout = min(timeout, 0.2) if timeout is not None else 0.2
+                    _, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.browser_executor.shutdown(wait=True)
+
+    async def fetch(self, session, semaphore, url):
+        """在并发上限内获取页面，返回(状态码, HTML)"""
+        if self.scraper.replay:
+            return self.scraper.fetch_static_html(url)
+        page_store = self.scraper.page_store
+        rate_limiter = self.scraper.rate_limiter
+        cache = self.scraper.http_cache
+        entry = cache.lookup('GET', url) if cache else None
+        if entry and entry['status'] != 200:
+            entry = None  # 重定向等条目由requests路径使用
+        if cache and cache.is_fresh(entry):
+            cache.count('hits')
+            return 200, cache.read_body('GET', url).decode('utf-8', errors='replace')
+
+        async with semaphore:
+            wait = rate_limiter.reserve(url)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            start = time.monotonic()
+            status = retry_after = None
+            headers = HttpCache.conditional_headers(entry) if entry else {}
+            try:
+                async with session.get(url, allow_redirects=True, headers=headers) as response:
+                    status = response.status
+                    retry_after = HostRateLimiter.parse_retry_after(response.headers.get('Retry-After'))
+                    if response.status == 304 and entry:
+                        cache.count('revalidated')
+                        cache.refresh('GET', url, entry)
+                        return 200, cache.read_body('GET', url).decode('utf-8', errors='replace')
+                    if response.status != 200:
+                        if page_store:
+                            page_store.save(url, response.status, await response.text(errors='replace'),
+                                            headers=response.headers, final_url=str(response.url))
+                        return response.status, ''
+                    body = await response.read()
+                    if cache:
+                        cache.count('misses')
+                        if not response.history:
+                            cache.store('GET', url, 200, response.headers, body)
+                    page_html = body.decode(response.get_encoding(), errors='replace')
+                    if page_store:
+                        page_store.save(url, 200, page_html, headers=response.headers, final_url=str(response.url))
+                    return response.status, page_html
+            finally:
+                rate_limiter.feedback(url, status, time.monotonic() - start, retry_after)
+
+    async def process(self, session, semaphore, url):
+        start = time.perf_counter()
+        try:
+            await self.process_url(session, semaphore, url)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.scraper.metrics.observe('url_total', elapsed)
+            # 与线程模式一致，每个URL都计入自动调节；失败由 record_failed 计入
+            if self.scraper.tuner:
+                self.scraper.tuner.observe(elapsed)
+
+    async def process_url(self, session, semaphore, url):
+        scraper = self.scraper
+        status_code = None
+        try:
+            # GET的状态码已经包含HEAD检查的信息，这里不再单独发送HEAD
+            fetch_start = time.perf_counter()
+            status_code, page_html = await self.fetch(session, semaphore, url)
+            scraper.metrics.observe('static_fetch', time.perf_counter() - fetch_start)
+            if status_code == 404:
+                logger.info(f"[async] 跳过404页面: {url}")
+                scraper.record_skipped(url)
+                return
+            if status_code >= 500:
+                scraper.record_failed(url, HttpStatusError(status_code, url))
+                return
+
+            if status_code == 200:
+                with scraper.metrics.timer('static_parse'):
+                    product_info = parse_product_html(page_html, url)
+                if product_info is None:
+                    logger.info(f"[async] 静态HTML检测到404页面: {url}")
+                    scraper.record_skipped(url)
+                    return
+                if has_core_fields(product_info):
+                    with scraper.lock:
+                        scraper.static_hits += 1
+                    scraper.record_product(product_info)
+                    return
+        except Exception as e:
+            logger.warning(f"[async] 静态获取失败 {url}: {e}")
+
+        # 需要JS渲染的页面交给浏览器线程池
+        with scraper.lock:
+            scraper.browser_fallbacks += 1
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self.browser_executor, scraper.extract_product_info_optimized, url, status_code != 200)
+        except Exception as e:
+            logger.error(f"处理 {url} 时出错: {e}")
+            scraper.record_failed(url, e)
+            return
+        if result:
+            scraper.record_product(result)
+
+
+def parse_shard(value):
+    """解析 'i/N' 形式的分片参数"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片格式应为 i/N，例如 0/4: {value}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"分片序号必须满足 0 <= i < N: {value}")
+    return index, count
+
+
+def shard_urls(urls, index, count):
+    """按规范去重键的CRC32确定性分片，同一SKU的所有URL变体在任何机器上都落在同一分片"""
+    return [url for url in urls if zlib.crc32(canonical_key(url).encode('utf-8')) % count == index]
+
+
+def strip_cli_options(argv, options):
+    """从命令行参数中移除指定选项及其取值"""
+    result = []
+    skip_next = False
+    for arg in argv:
+        if skip_next:
+            skip_next = False
+            continue
+        name = arg.split('=', 1)[0]
+        if name in options:
+            skip_next = '=' not in arg
+            continue
+        result.append(arg)
+    return result
+
+
+def merge_shard_outputs(output_prefix, shard_prefixes, write_excel=True, since=None):
+    """合并各分片的结果CSV和爬取日志，返回合并后的CSV路径
+
+    since为协调器启动时间戳，本次没有写出CSV的分片 (只有404或失败) 不会误用旧的结果文件。
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_path = f'{output_prefix}_{timestamp}.csv'
+    product_count = 0
+
+    with open(csv_path, 'w', encoding='utf-8', newline='') as out:
+        writer = csv.DictWriter(out, fieldnames=PRODUCT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for shard_prefix in shard_prefixes:
+            shard_csv = find_previous_results(shard_prefix, since=since)
+            if not shard_csv:
+                continue
+            with open(shard_csv, 'r', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    writer.writerow(row)
+                    product_count += 1
+
+    skipped, failed = [], []
+    with open(f'{output_prefix}.journal.jsonl', 'w', encoding='utf-8') as out:
+        for shard_prefix in shard_prefixes:
+            shard_journal = f'{shard_prefix}.journal.jsonl'
+            if not os.path.exists(shard_journal):
+                continue
+            for url, entry in CrawlJournal.load(shard_journal).items():
+                out.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                if entry['status'] == 'skipped':
+                    skipped.append(url)
+                elif entry['status'] == 'failed':
+                    failed.append(url)
+
+    for name, urls in (('skipped_urls', skipped), ('failed_urls', failed)):
+        if urls:
+            with open(f'{name}_{timestamp}.txt', 'w', encoding='utf-8') as f:
+                for url in urls:
+                    f.write(url + '\n')
+
+    print(f"\n=== 分片合并结果 ===")
+    print(f"成功获取: {product_count}")
+    print(f"跳过404页面: {len(skipped)}")
+    print(f"失败: {len(failed)}")
+
+    if not product_count:
+        return None, None
+    excel_path = None
+    if write_excel:
+        excel_path = f'{output_prefix}_{timestamp}.xlsx'
+        convert_csv_to_xlsx(csv_path, excel_path)
+    return csv_path, excel_path
+
+
+def export_queue_results(job_queue, output_prefix, write_excel=True, dedup_index=None):
+    """把队列中的结果导出为CSV/Excel和跳过/失败URL列表，结果展开到入队前折叠的别名URL"""
+    dedup_index = dedup_index or UrlDedupIndex()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_path = f'{output_prefix}_{timestamp}.csv'
+    product_count = 0
+    with open(csv_path, 'w', encoding='utf-8', newline='') as out:
+        writer = csv.DictWriter(out, fieldnames=PRODUCT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for product in job_queue.iter_products():
+            writer.writerow(product)
+            product_count += 1
+            for alias in dedup_index.aliases_of(product['url']):
+                writer.writerow(alias_product(product, alias))
+                product_count += 1
+
+    url_counts = {}
+    for status, name in (('skipped', 'skipped_urls'), ('failed', 'failed_urls')):
+        urls = [alias for url in job_queue.iter_urls(status) for alias in [url] + dedup_index.aliases_of(url)]
+        url_counts[status] = len(urls)
+        if urls:
+            with open(f'{name}_{timestamp}.txt', 'w', encoding='utf-8') as f:
+                for url in urls:
+                    f.write(url + '\n')
+
+    stats = job_queue.stats()
+    print(f"\n=== 任务队列结果 ===")
+    print(f"成功获取: {product_count}")
+    print(f"跳过404页面: {url_counts['skipped']}")
+    print(f"失败: {url_counts['failed']}")
+    print(f"未完成: {stats.get('pending', 0) + stats.get('leased', 0)}")
+
+    if not product_count:
+        return None, None
+    excel_path = None
+    if write_excel:
+        excel_path = f'{output_prefix}_{timestamp}.xlsx'
+        convert_csv_to_xlsx(csv_path, excel_path)
+    return csv_path, excel_path
+
+
+def start_enqueue_thread(job_queue, feed, batch_size=500):
+    """后台线程把边发现边写入的URL分批入队，worker可以同时拉取；全部入队后清除入队中标记"""
+    job_queue.set_producing(True)
+
+    def enqueue_loop():
+        added = 0
+        try:
+            while not feed.exhausted():
+                feed.wait(timeout=1.0)
+                batch = feed.take(batch_size)
+                if batch:
+                    added += job_queue.enqueue(batch)
+        finally:
+            job_queue.set_producing(False)
+            logger.info(f"发现的URL已全部入队: 新入队 {added} 个URL")
+
+    thread = threading.Thread(target=enqueue_loop, name='queue-enqueue', daemon=True)
+    thread.start()
+    return thread
+
+
+def run_queue_processes(args, argv):
+    """本机协调器：启动N个队列worker进程，等待队列清空后导出结果"""
+    base_args = strip_cli_options(argv, {'--processes', '--shard', '-o', '--output-prefix', '--journal', '-u', '--urls-file'})
+    processes = []
+    for index in range(args.processes):
+        cmd = [sys.executable, os.path.abspath(__file__)] + base_args + [
+            '--queue-worker', '-o', f'{args.output_prefix}_worker{index}', '--no-excel']
+        logger.info(f"启动队列worker {index}: {' '.join(cmd)}")
+        processes.append(subprocess.Popen(cmd))
+    for index, process in enumerate(processes):
+        code = process.wait()
+        if code != 0:
+            logger.warning(f"队列worker {index} 异常退出 (退出码 {code})，其租约过期后任务会被重新分配")
+
+
+def run_sharded_processes(args, argv):
+    """本机协调器：启动N个分片子进程并合并它们的输出"""
+    count = args.processes
+    base_args = strip_cli_options(argv, {'--processes', '--shard', '-o', '--output-prefix', '--journal'})
+    shard_prefixes = [f'{args.output_prefix}_shard{index}' for index in range(count)]
+    started = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    processes = []
+    for index, shard_prefix in enumerate(shard_prefixes):
+        cmd = [sys.executable, os.path.abspath(__file__)] + base_args + [
+            '--shard', f'{index}/{count}', '-o', shard_prefix, '--no-excel']
+        logger.info(f"启动分片 {index}/{count}: {' '.join(cmd)}")
+        processes.append(subprocess.Popen(cmd))
+
+    exit_codes = [process.wait() for process in processes]
+    for index, code in enumerate(exit_codes):
+        if code != 0:
+            logger.warning(f"分片 {index}/{count} 异常退出 (退出码 {code})，合并其已写入的部分结果")
+
+    return merge_shard_outputs(args.output_prefix, shard_prefixes, write_excel=not args.no_excel, since=started)
+
+
 def parse_arguments():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='Cambridge Isotope Laboratories 多线程爬虫')
@@ -514,6 +3407,146 @@ def parse_arguments():
     parser.add_argument('-v', '--verbose', action='store_true',
                        help='详细输出模式')
 
+    parser.add_argument('--engine', choices=['selenium', 'static', 'async'], default='selenium',
+                       help='提取引擎: selenium=浏览器渲染, static=HTTP+lxml快速解析并按需回退Selenium, '
+                            'async=asyncio并发获取静态HTML, 仅JS页面交给浏览器 (默认: selenium)')
+
+    parser.add_argument('--concurrency', type=int, default=100,
+                       help='async引擎的最大并发请求数 (默认: 100)')
+
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                       help='只处理第 i 个分片 (共 N 个)，格式 i/N，用于多进程或多机器分工')
+
+    parser.add_argument('--processes', type=int, default=1,
+                       help='在本机启动N个分片进程并在结束后合并结果 (默认: 1)')
+
+    parser.add_argument('--queue', type=str, default=None,
+                       help='任务队列地址 (SQLite文件路径或 sqlite:///path)，URL入队后由worker拉取处理')
+
+    parser.add_argument('--queue-worker', action='store_true',
+                       help='只作为worker从 --queue 拉取任务，不入队也不导出结果')
+
+    parser.add_argument('--lease-timeout', type=int, default=300,
+                       help='任务租约秒数，worker超时未回报时任务重新入队 (默认: 300)')
+
+    parser.add_argument('--max-attempts', type=int, default=3,
+                       help='每个URL的最大尝试次数，失败后按指数退避重新排队 (默认: 3)')
+
+    parser.add_argument('--retry-delay', type=float, default=10.0,
+                       help='第一次重试的等待秒数，之后每次翻倍 (默认: 10)')
+
+    parser.add_argument('--jsonl', action='store_true',
+                       help='同时实时写入JSONL结果文件')
+
+    parser.add_argument('--no-excel', action='store_true',
+                       help='结束时不从CSV生成Excel文件')
+
+    parser.add_argument('--incremental', action='store_true',
+                       help='增量模式：内容哈希未变化的产品跳过详细提取，并输出新增/变化/下架的差异文件')
+
+    parser.add_argument('--previous', type=str, default=None,
+                       help='增量模式对比的上一次结果CSV (默认: 同前缀最新的结果文件)')
+
+    parser.add_argument('--journal', type=str, default=None,
+                       help='爬取日志路径 (默认: <输出前缀>.journal.jsonl)')
+
+    parser.add_argument('--resume', action='store_true',
+                       help='从爬取日志续爬：跳过已完成的URL，只重试失败的URL')
+
+    parser.add_argument('--http-cache', type=str, default=None,
+                       help='磁盘HTTP缓存目录，用于HEAD检查和静态请求 (默认: 不启用)')
+
+    parser.add_argument('--cache-ttl', type=int, default=3600,
+                       help='缓存条目无需重新验证的秒数，过期后发送条件请求 (默认: 3600)')
+
+    parser.add_argument('--cache-max-mb', type=int, default=1024,
+                       help='HTTP缓存最大占用空间MB (默认: 1024)')
+
+    parser.add_argument('--rate', type=float, default=2.0,
+                       help='每个主机每秒最多发起的请求数 (默认: 2.0)')
+
+    parser.add_argument('--max-per-host', type=int, default=8,
+                       help='每个主机同时进行的最大请求数 (默认: 8)')
+
+    parser.add_argument('--block-resources', type=str, default=','.join(ResourceBlocker.DEFAULT_CATEGORIES),
+                       help='浏览器屏蔽的资源类别，逗号分隔: image,font,media,analytics,third_party 或 none '
+                            '(默认: 全部屏蔽)')
+
+    parser.add_argument('--block-url', action='append', default=[],
+                       help='额外屏蔽的URL通配模式，可重复使用 (例如: "*cdn.example.com*")')
+
+    parser.add_argument('--ready-timeout', type=float, default=20,
+                       help='等待页面就绪的最长秒数 (默认: 20)')
+
+    parser.add_argument('--chromedriver', type=str, default=None,
+                       help='本地chromedriver路径，离线运行时使用 (默认: 环境变量CHROMEDRIVER_PATH或自动下载)')
+
+    parser.add_argument('--driver-max-pages', type=int, default=50,
+                       help='每个浏览器实例处理多少个页面后重启 (默认: 50)')
+
+    parser.add_argument('--driver-max-rss-mb', type=int, default=1024,
+                       help='单个浏览器 (chromedriver+Chrome进程树) 的内存预算，超出后回收 (默认: 1024, 0为不限制)')
+
+    parser.add_argument('--host-memory-limit', type=float, default=90.0,
+                       help='主机内存使用率上限 (%%)，超过时关闭空闲浏览器并暂停借出 (默认: 90, 0为不限制)')
+
+    parser.add_argument('--discover', action='append', default=[],
+                       help='从sitemap或分类列表页发现产品URL，可重复使用；边发现边爬取 (例如: https://isotope.com/sitemap.xml)')
+
+    parser.add_argument('--discover-max-pages', type=int, default=2000,
+                       help='发现阶段最多获取的sitemap/列表页数量 (默认: 2000)')
+
+    parser.add_argument('--discover-depth', type=int, default=3,
+                       help='从分类页跟随子分类和分页链接的最大深度 (默认: 3)')
+
+    parser.add_argument('--discover-output', type=str, default=None,
+                       help='把发现的产品URL写入该文本文件，可作为之后的 -u 输入')
+
+    parser.add_argument('--preflight', action='store_true',
+                       help='抓取前并发HEAD预检全部URL：404和失效链接不占用浏览器，重定向只解析一次')
+
+    parser.add_argument('--preflight-concurrency', type=int, default=32,
+                       help='预检的并发请求数，仍受 --rate/--max-per-host 限制 (默认: 32)')
+
+    parser.add_argument('--preflight-cache', type=str, default=None,
+                       help='预检结果缓存文件 (默认: <输出前缀>.preflight.json)')
+
+    parser.add_argument('--preflight-ttl', type=int, default=86400,
+                       help='预检缓存的有效秒数 (默认: 86400)')
+
+    parser.add_argument('--autotune', action='store_true',
+                       help='运行中根据页面延迟、错误率和可用内存自动调整活跃worker数，-t 作为上限')
+
+    parser.add_argument('--autotune-min', type=int, default=1,
+                       help='自动调节的最少worker数 (默认: 1)')
+
+    parser.add_argument('--autotune-interval', type=float, default=15.0,
+                       help='自动调节的周期秒数 (默认: 15)')
+
+    parser.add_argument('--memory-reserve-mb', type=int, default=1024,
+                       help='自动调节为系统保留的可用内存 (MB)，低于该值时减少worker (默认: 1024)')
+
+    parser.add_argument('--no-dedup', action='store_true',
+                       help='不折叠同一产品的URL变体 (分类前缀路径、-pk后缀、itemno=链接)，每个URL都单独抓取')
+
+    parser.add_argument('--record', type=str, default=None,
+                       help='录制模式：把每个页面的最终HTML和响应头保存到该目录')
+
+    parser.add_argument('--replay', type=str, default=None,
+                       help='回放模式：从录制目录读取页面，不访问网络；未指定 -u 时处理目录中的全部页面')
+
+    parser.add_argument('--metrics-json', type=str, default=None,
+                       help='各阶段耗时分布 (p50/p95/p99) 的JSON报告路径 (默认: 不输出)')
+
+    parser.add_argument('--metrics-prom', type=str, default=None,
+                       help='结束时写入Prometheus文本格式的.prom文件路径 (默认: 不输出)')
+
+    parser.add_argument('--metrics-port', type=int, default=None,
+                       help='运行期间在该端口提供Prometheus /metrics 端点 (默认: 不启用)')
+
+    parser.add_argument('--metrics-host', type=str, default='127.0.0.1',
+                       help='/metrics 端点监听的地址，容器内需要被外部抓取时设为 0.0.0.0 (默认: 127.0.0.1)')
+
     return parser.parse_args()
 
 def load_urls_from_file(file_path):
@@ -546,11 +3579,14 @@ def main():
     """主函数"""
     args = parse_arguments()
 
-    # 验证线程数并给出警告
-    if args.threads > 16:
+    # 验证线程数并给出警告 (分片子进程由协调器统一确认，不再重复提示)
+    if args.autotune and not args.shard:
+        # 由自动调节根据实测延迟、错误率和内存决定实际并发
+        print(f"自动调节: 活跃worker数在 {min(args.autotune_min, args.threads)}-{args.threads} 之间动态调整")
+    elif not args.shard and args.threads > 16:
         print(f"⚠️  警告: 使用 {args.threads} 个线程可能导致以下问题:")
         print(f"   - 网站可能封禁您的IP地址")
-        print(f"   - 系统资源消耗过大 (预计需要 {args.threads * 200}MB+ 内存)")
+        print(f"   - 系统资源消耗过大 (可使用 --autotune 按实际内存自动限制)")
         print(f"   - 可能被视为DDoS攻击")
 
         if args.threads > 64:
@@ -560,8 +3596,17 @@ def main():
                 print("已取消执行")
                 return
 
-    elif args.threads > 8:
-        print(f"⚠️  注意: {args.threads} 个线程较多，建议监控系统资源使用情况")
+    elif not args.shard and args.threads > 8:
+        print(f"⚠️  注意: {args.threads} 个线程较多，建议监控系统资源使用情况或使用 --autotune")
+
+    if args.record and args.replay:
+        print("错误: --record 和 --replay 不能同时使用")
+        return
+
+    if args.engine == 'async' and args.queue:
+        # 队列worker按线程逐个租用任务，async引擎没有接入租约，只能处理静态列表或发现结果
+        print("错误: --engine async 不支持 --queue，请改用 --engine static 或 selenium")
+        return
 
     # 设置日志级别
     if args.verbose:
@@ -569,16 +3614,43 @@ def main():
 
     print(f"\n=== Cambridge Isotope Laboratories 多线程爬虫 ===")
     print(f"线程数: {args.threads}")
+    print(f"提取引擎: {args.engine}")
     print(f"Headless模式: {args.headless}")
     print(f"最大产品数: {args.max_products or '无限制'}")
     print(f"输出前缀: {args.output_prefix}")
 
+    if args.processes > 1 and not args.shard and not args.queue:
+        print(f"分片进程数: {args.processes}")
+        csv_file, excel_file = run_sharded_processes(args, sys.argv[1:])
+        if csv_file:
+            print(f"\n✅ 分片爬取完成！")
+            print(f"📁 文件已保存:")
+            print(f"   - {csv_file}")
+            if excel_file:
+                print(f"   - {excel_file}")
+        else:
+            print(f"\n⚠️  没有成功爬取到数据")
+        return
+
+    job_queue = open_job_queue(args.queue, max_attempts=args.max_attempts) if args.queue else None
+
     # 获取URL列表
-    if args.urls_file:
+    if args.queue_worker:
+        if not job_queue:
+            print("错误: --queue-worker 需要同时指定 --queue")
+            return
+        urls = []
+    elif args.urls_file:
         urls = load_urls_from_file(args.urls_file)
         if not urls:
             print("错误: 无法从文件加载URL")
             return
+    elif args.replay:
+        urls = PageStore(args.replay).urls()
+        print(f"回放目录 {args.replay}: {len(urls)} 个页面")
+    elif args.discover:
+        urls = None  # 由发现阶段边发现边提供
+        print(f"产品发现: {len(args.discover)} 个入口")
     else:
         # 使用内置测试URL
         urls = [
@@ -591,30 +3663,155 @@ def main():
         ]
         print(f"使用内置测试URL: {len(urls)} 个")
 
+    if args.shard and urls is not None:
+        index, count = args.shard
+        urls = shard_urls(urls, index, count)
+        print(f"分片 {index}/{count}: {len(urls)} 个URL")
+
+    # 同一SKU的URL变体只抓取一次，结果展开到所有别名
+    dedup_index = UrlDedupIndex()
+
+    enqueue_thread = None
+    if job_queue and not args.queue_worker:
+        if urls is None:
+            # 发现的URL在后台分批入队，本机和其他机器上的worker同时开始拉取
+            feed = UrlFeed(limit=args.max_products)
+            CatalogDiscovery(max_pages=args.discover_max_pages, max_depth=args.discover_depth,
+                             output_path=args.discover_output).start(args.discover, feed)
+            enqueue_thread = start_enqueue_thread(job_queue, feed)
+            print(f"任务队列 {args.queue}: 发现的URL边发现边入队")
+        else:
+            if not args.no_dedup:
+                urls = dedup_index.collapse(urls)
+            if args.max_products:
+                urls = urls[:args.max_products]
+            added = job_queue.enqueue(urls)
+            print(f"任务队列 {args.queue}: 新入队 {added} 个URL, 当前状态 {job_queue.stats()}")
+        if args.processes > 1:
+            try:
+                run_queue_processes(args, sys.argv[1:])
+            finally:
+                if enqueue_thread and enqueue_thread.is_alive():
+                    job_queue.set_producing(False)  # 中断时清除入队中标记，其他worker可以正常退出
+            if enqueue_thread:
+                enqueue_thread.join()
+            csv_file, excel_file = export_queue_results(job_queue, args.output_prefix, write_excel=not args.no_excel,
+                                                        dedup_index=dedup_index)
+            if csv_file:
+                print(f"\n✅ 队列爬取完成！")
+                print(f"📁 文件已保存:")
+                print(f"   - {csv_file}")
+                if excel_file:
+                    print(f"   - {excel_file}")
+            return
+
     # 创建爬虫实例
     scraper = OptimizedMultithreadedScraper(
         max_workers=args.threads,
-        headless=args.headless
+        headless=args.headless,
+        driver_max_pages=args.driver_max_pages,
+        engine=args.engine,
+        ready_timeout=args.ready_timeout,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        max_per_host=args.max_per_host,
+        resource_blocker=ResourceBlocker.from_option(args.block_resources, args.block_url),
+        chromedriver_path=args.chromedriver,
+        max_attempts=args.max_attempts,
+        retry_delay=args.retry_delay,
+        driver_max_rss_mb=args.driver_max_rss_mb,
+        host_memory_limit=args.host_memory_limit,
+        replay=args.replay
     )
 
-    # 设置输出前缀
+    # 设置输出前缀和格式
     scraper.output_prefix = args.output_prefix
+    scraper.write_jsonl = args.jsonl
+    scraper.write_excel = not args.no_excel
+    if args.shard:
+        scraper.url_list_suffix = f'_shard{args.shard[0]}'
+    elif args.queue_worker:
+        scraper.url_list_suffix = f'_worker{os.getpid()}'
+
+    # 阶段耗时报告，分片和队列worker的文件名带上后缀避免互相覆盖
+    if args.metrics_json:
+        root, ext = os.path.splitext(args.metrics_json)
+        scraper.metrics_json = f'{root}{scraper.url_list_suffix}{ext}'
+    if args.metrics_prom:
+        root, ext = os.path.splitext(args.metrics_prom)
+        scraper.metrics_prom = f'{root}{scraper.url_list_suffix}{ext}'
+    if args.metrics_port:
+        try:
+            scraper.metrics.serve(args.metrics_port, host=args.metrics_host)
+        except OSError as e:
+            logger.warning(f"无法启动指标端点 ({args.metrics_host}:{args.metrics_port}): {e}")
+
+    if args.http_cache:
+        scraper.enable_http_cache(args.http_cache, ttl=args.cache_ttl,
+                                  max_bytes=args.cache_max_mb * 1024 * 1024)
+
+    if args.record:
+        scraper.enable_record(args.record)
+
+    if args.incremental:
+        scraper.enable_incremental(args.previous)
+
+    if args.autotune:
+        scraper.enable_autotune(min_workers=args.autotune_min, interval=args.autotune_interval,
+                                reserve_mb=args.memory_reserve_mb)
+
+    # 打开爬取日志，续爬时过滤已完成的URL
+    journal_path = args.journal or f'{args.output_prefix}.journal.jsonl'
+    finished = scraper.open_journal(journal_path, resume=args.resume)
+    if urls is None and not job_queue:
+        # 发现线程与爬取同时进行，分片和续爬过滤在URL写入时完成
+        def accept(url):
+            if url in finished:
+                return False
+            return not args.shard or bool(shard_urls([url], *args.shard))
+
+        urls = UrlFeed(limit=args.max_products, accept=accept)
+        CatalogDiscovery(session=scraper.session, rate_limiter=scraper.rate_limiter,
+                         max_pages=args.discover_max_pages, max_depth=args.discover_depth,
+                         output_path=args.discover_output).start(args.discover, urls)
+    elif finished and urls:
+        urls = [url for url in urls if url not in finished]
+        print(f"续爬: 跳过已完成的 {len(finished)} 个URL，剩余 {len(urls)} 个")
+
+    scraper.dedup_index = dedup_index
+    # 发现模式的UrlFeed在写入时已按去重键过滤，只折叠静态URL列表
+    if isinstance(urls, list) and urls and not job_queue and not args.no_dedup:
+        urls = scraper.collapse_urls(urls)
+
+    if args.preflight and isinstance(urls, list) and urls and not args.replay and not job_queue:
+        # 只预检本次会处理的URL，-n 限制在预检之前生效
+        if args.max_products:
+            urls = urls[:args.max_products]
+        urls = scraper.preflight(urls, concurrency=args.preflight_concurrency,
+                                 cache_path=args.preflight_cache or f'{args.output_prefix}.preflight.json',
+                                 ttl=args.preflight_ttl)
 
     try:
         print(f"\n开始爬取...")
-        scraper.scrape_products_multithreaded(urls, max_products=args.max_products)
+        if job_queue:
+            scraper.run_queue_worker(job_queue, lease_seconds=args.lease_timeout)
+        else:
+            scraper.scrape_products_multithreaded(urls, max_products=args.max_products)
         csv_file, excel_file = scraper.save_results()
 
         if csv_file:
             print(f"\n✅ 多线程爬取完成！")
             print(f"📁 文件已保存:")
             print(f"   - {csv_file}")
-            print(f"   - {excel_file}")
+            if excel_file:
+                print(f"   - {excel_file}")
         else:
             print(f"\n⚠️  没有成功爬取到数据")
 
     except KeyboardInterrupt:
         print(f"\n⏹️  用户中断了爬取过程")
+        if enqueue_thread and enqueue_thread.is_alive():
+            job_queue.set_producing(False)
         scraper.save_results()
     except Exception as e:
         print(f"\n❌ 爬取过程出错: {e}")
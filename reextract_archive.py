@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+离线批量重新提取
+对保存的产品页面 (目录、tar 或 zip，包括 --record 录制目录和 debug_page_*.html)
+用多进程重新运行提取逻辑，输出与爬虫相同格式的CSV/Excel
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from optimized_multithreaded_scraper import (
+    StreamingResultWriter, convert_csv_to_xlsx, parse_product_html, logger,
+)
+
+HTML_SUFFIXES = ('.html', '.htm')
+
+CANONICAL_RE = re.compile(
+    r'<link[^>]+rel=["\']canonical["\'][^>]*href=["\']([^"\']+)["\']'
+    r'|<meta[^>]+property=["\']og:url["\'][^>]*content=["\']([^"\']+)["\']',
+    re.IGNORECASE,
+)
+
+
+def page_url(name, page_html, meta):
+    """页面URL：优先使用录制的元数据，其次canonical/og:url，最后用文件名"""
+    if meta and meta.get('url'):
+        return meta['url']
+    match = CANONICAL_RE.search(page_html[:20000])
+    if match:
+        return match.group(1) or match.group(2)
+    return name
+
+
+def iter_directory(path):
+    """遍历目录中的HTML文件，返回 (名称, HTML, 元数据)"""
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if not name.endswith(HTML_SUFFIXES):
+                continue
+            file_path = os.path.join(root, name)
+            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                page_html = f.read()
+            meta = None
+            meta_path = os.path.splitext(file_path)[0] + '.json'
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            yield file_path, page_html, meta
+
+
+def iter_members(names, read):
+    """按名称遍历压缩包成员，同名.json作为元数据"""
+    name_set = set(names)
+    for name in sorted(names):
+        if not name.endswith(HTML_SUFFIXES):
+            continue
+        page_html = read(name).decode('utf-8', errors='replace')
+        meta = None
+        meta_name = os.path.splitext(name)[0] + '.json'
+        if meta_name in name_set:
+            meta = json.loads(read(meta_name).decode('utf-8'))
+        yield name, page_html, meta
+
+
+def iter_pages(source):
+    """根据来源类型 (目录/tar/zip) 遍历保存的页面"""
+    if os.path.isdir(source):
+        yield from iter_directory(source)
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            yield from iter_members(archive.namelist(), archive.read)
+    elif tarfile.is_tarfile(source):
+        with tarfile.open(source) as archive:
+            members = {member.name: member for member in archive.getmembers() if member.isfile()}
+            yield from iter_members(list(members), lambda name: archive.extractfile(members[name]).read())
+    else:
+        raise ValueError(f"不支持的来源: {source} (需要目录、tar 或 zip)")
+
+
+def extract_batch(batch):
+    """在子进程中提取一批页面，返回 [(状态, URL, 产品信息或错误)]"""
+    results = []
+    for name, page_html, meta in batch:
+        url = page_url(name, page_html, meta)
+        try:
+            if (meta and meta.get('status') == 404) or not page_html.strip():
+                results.append(('skipped', url, None))
+                continue
+            product_info = parse_product_html(page_html, url)
+            if product_info is None:
+                results.append(('skipped', url, None))
+            else:
+                results.append(('ok', url, product_info))
+        except Exception as e:
+            results.append(('failed', url, f'{name}: {e}'))
+    return results
+
+
+def iter_batches(sources, batch_size):
+    batch = []
+    for source in sources:
+        for page in iter_pages(source):
+            batch.append(page)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def reextract(sources, output_prefix, processes=None, batch_size=50, write_excel=True, write_jsonl=False):
+    """多进程重新提取，按输入顺序写出结果，返回 (CSV路径, Excel路径)"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_path = f'{output_prefix}_{timestamp}.csv'
+    jsonl_path = f'{output_prefix}_{timestamp}.jsonl' if write_jsonl else None
+    writer = StreamingResultWriter(csv_path, jsonl_path)
+    skipped_urls = []
+    failed = []
+    processes = processes or os.cpu_count() or 1
+    start = time.time()
+
+    def consume(results):
+        for status, url, payload in results:
+            if status == 'ok':
+                writer.write(payload)
+            elif status == 'skipped':
+                skipped_urls.append(url)
+            else:
+                failed.append((url, payload))
+
+    # 限制在途批次数量，大压缩包也不会一次读入内存
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = deque()
+        for batch in iter_batches(sources, batch_size):
+            pending.append(executor.submit(extract_batch, batch))
+            if len(pending) >= processes * 2:
+                consume(pending.popleft().result())
+        while pending:
+            consume(pending.popleft().result())
+    writer.close()
+
+    elapsed = time.time() - start
+    total = writer.count + len(skipped_urls) + len(failed)
+    logger.info(f"重新提取完成: {total} 个页面, 耗时 {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} 页/秒)")
+
+    if skipped_urls:
+        with open(f'skipped_urls_{timestamp}_reextract.txt', 'w', encoding='utf-8') as f:
+            for url in skipped_urls:
+                f.write(url + '\n')
+    if failed:
+        with open(f'failed_urls_{timestamp}_reextract.txt', 'w', encoding='utf-8') as f:
+            for url, error in failed:
+                f.write(url + '\n')
+                logger.warning(f"提取失败 {error}")
+
+    print(f"\n=== 离线重新提取结果 ===")
+    print(f"总处理数量: {total}")
+    print(f"成功获取: {writer.count}")
+    print(f"跳过404页面: {len(skipped_urls)}")
+    print(f"失败: {len(failed)}")
+
+    if not writer.count:
+        return None, None
+
+    filled = writer.filled
+    print(f"\n数据质量:")
+    print(f"有产品名称: {filled['name']}")
+    print(f"有CAS Labeled: {filled['cas_labeled']}")
+    print(f"有CAS Unlabeled: {filled['cas_unlabeled']}")
+    print(f"有分子式: {filled['formula']}")
+    print(f"有图片: {filled['image_url']}")
+
+    excel_path = None
+    if write_excel:
+        excel_path = f'{output_prefix}_{timestamp}.xlsx'
+        convert_csv_to_xlsx(csv_path, excel_path)
+    return csv_path, excel_path
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='对保存的产品页面离线重新运行提取逻辑')
+
+    parser.add_argument('sources', nargs='+',
+                       help='页面来源：目录 (如 --record 录制目录)、.tar/.tar.gz 或 .zip')
+
+    parser.add_argument('-o', '--output-prefix', type=str, default='reextracted_products',
+                       help='输出文件前缀 (默认: reextracted_products)')
+
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                       help='进程数 (默认: CPU核心数)')
+
+    parser.add_argument('--batch-size', type=int, default=50,
+                       help='每个进程任务包含的页面数 (默认: 50)')
+
+    parser.add_argument('--jsonl', action='store_true',
+                       help='同时写入JSONL结果文件')
+
+    parser.add_argument('--no-excel', action='store_true',
+                       help='不从CSV生成Excel')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    for source in args.sources:
+        if not os.path.exists(source):
+            print(f"错误: 来源不存在: {source}")
+            return 1
+
+    csv_file, excel_file = reextract(args.sources, args.output_prefix, processes=args.processes,
+                                     batch_size=args.batch_size, write_excel=not args.no_excel,
+                                     write_jsonl=args.jsonl)
+    if csv_file:
+        print(f"\n✅ 重新提取完成！")
+        print(f"📁 文件已保存:")
+        print(f"   - {csv_file}")
+        if excel_file:
+            print(f"   - {excel_file}")
+    else:
+        print(f"\n⚠️  没有提取到数据")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
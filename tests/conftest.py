@@ -0,0 +1,54 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 爬虫模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PRODUCT_PAGE = ('<html><head><title>{name} - Cambridge Isotope Laboratories</title></head><body>'
+                '<h1>{name}</h1><div class="Details_customHorizontal"><span class="Details_name">Formula</span>'
+                '<span>{formula}</span></div></body></html>')
+
+
+@pytest.fixture
+def catalog_server():
+    pages = {
+        '/l-alanine-clm-116': PRODUCT_PAGE.format(name='L-Alanine', formula='C3H7NO2'),
+        '/l-alanine-clm-116-pk': PRODUCT_PAGE.format(name='L-Alanine', formula='C3H7NO2'),
+        '/d-glucose-cdlm-4895': PRODUCT_PAGE.format(name='D-Glucose', formula='C6H12O6'),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/sitemap.xml':
+                base = f'http://127.0.0.1:{self.server.server_address[1]}'
+                locs = ''.join(f'<url><loc>{base}{path}</loc></url>' for path in pages)
+                body = f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</urlset>'
+                content_type = 'application/xml'
+            elif self.path in pages:
+                body = pages[self.path]
+                content_type = 'text/html; charset=utf-8'
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_HEAD = do_GET
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
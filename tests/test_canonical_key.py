@@ -0,0 +1,52 @@
+import pytest
+
+from optimized_multithreaded_scraper import UrlDedupIndex, canonical_key, extract_product_number
+
+
+@pytest.mark.parametrize('url, number', [
+    ('https://isotope.com/carbohydrates/d-glucose-1-13c-6-13c-6-6-d2-cdlm-4895', 'CDLM-4895'),
+    ('https://isotope.com/dimethyl-sulfoxide-d6-dlm-10-10', 'DLM-10-10'),
+    ('https://isotope.com/l-glutamine-13c5-15n2-cnlm-1275', 'CNLM-1275'),
+    ('https://isotope.com/l-leucine-d10-15n-dnlm-4714', 'DNLM-4714'),
+    ('https://isotope.com/l-arginine-13c6-d7-15n4-cdnlm-6801', 'CDNLM-6801'),
+    ('https://isotope.com/l-alanine-15n-nlm-454', 'NLM-454'),
+    ('https://isotope.com/search?itemNo=CLM-116', 'CLM-116'),
+])
+def test_extract_product_number_keeps_full_prefix(url, number):
+    assert extract_product_number(url) == number
+
+
+@pytest.mark.parametrize('first, second', [
+    ('https://isotope.com/x-cdlm-4895', 'https://isotope.com/x-dlm-4895'),
+    ('https://isotope.com/x-cnlm-1275', 'https://isotope.com/x-nlm-1275'),
+    ('https://isotope.com/x-dnlm-4714', 'https://isotope.com/x-nlm-4714'),
+    ('https://isotope.com/x-cdnlm-6801', 'https://isotope.com/x-dnlm-6801'),
+    ('https://isotope.com/x-cdnlm-6801', 'https://isotope.com/x-cnlm-6801'),
+])
+def test_different_prefixes_are_different_keys(first, second):
+    assert canonical_key(first) != canonical_key(second)
+
+
+@pytest.mark.parametrize('first, second', [
+    ('https://isotope.com/amino-acids/free-amino-acids/l-alanine-1-13c-clm-116-pk',
+     'https://isotope.com/l-alanine-1-13c-clm-116'),
+    ('https://isotope.com/l-alanine-1-13c-clm-116', 'https://isotope.com/search?itemNo=clm-116'),
+    ('https://isotope.com/carbohydrates/d-glucose-cdlm-4895', 'https://isotope.com/d-glucose-cdlm-4895/'),
+])
+def test_variants_of_same_sku_share_key(first, second):
+    assert canonical_key(first) == canonical_key(second)
+
+
+def test_url_key_without_product_number():
+    assert canonical_key('HTTPS://Isotope.com/a/b/page/?utm_source=x#top') == 'url:https://isotope.com/page'
+
+
+def test_collapse_keeps_distinct_prefixes_apart():
+    index = UrlDedupIndex()
+    urls = [
+        'https://isotope.com/x-cdlm-4895',
+        'https://isotope.com/x-dlm-4895',
+        'https://isotope.com/x-dlm-4895-pk',
+    ]
+    assert index.collapse(urls) == urls[:2]
+    assert index.aliases_of(urls[1]) == [urls[2]]
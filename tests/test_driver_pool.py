@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from optimized_multithreaded_scraper import BrowserMemoryWatchdog, DriverPool
+
+
+class DummyDriver:
+    def execute_script(self, script):
+        return 1
+
+    def quit(self):
+        pass
+
+
+def run_workers(pool, threads=3, pages=5):
+    """每个线程借出/归还浏览器若干次，返回同时持有浏览器的最大线程数"""
+    lock = threading.Lock()
+    state = {'holding': 0, 'peak': 0, 'pages': 0}
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        for _ in range(pages):
+            driver = pool.checkout()
+            with lock:
+                state['holding'] += 1
+                state['peak'] = max(state['peak'], state['holding'])
+            threading.Event().wait(0.02)
+            with lock:
+                state['holding'] -= 1
+                state['pages'] += 1
+            pool.checkin(driver)
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join(timeout=20)
+    assert not any(thread.is_alive() for thread in workers), "worker卡住"
+    return state
+
+
+@pytest.fixture
+def watchdog():
+    watchdog = BrowserMemoryWatchdog(driver_budget_mb=0, host_limit_percent=0, interval=60)
+    yield watchdog
+    watchdog.stop()
+
+
+def test_memory_pressure_keeps_one_worker_running(watchdog):
+    pool = DriverPool(DummyDriver, size=3, watchdog=watchdog)
+    watchdog.pressure = True
+    state = run_workers(pool)
+    assert state['pages'] == 15
+    assert state['peak'] == 1
+    assert pool.active == 0 and pool.holding == 0
+    assert watchdog.pauses > 0
+    pool.close()
+
+
+def test_no_pressure_allows_all_workers(watchdog):
+    pool = DriverPool(DummyDriver, size=3, watchdog=watchdog)
+    state = run_workers(pool)
+    assert state['pages'] == 15
+    assert state['peak'] > 1
+    pool.close()
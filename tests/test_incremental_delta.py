@@ -0,0 +1,26 @@
+import csv
+
+from optimized_multithreaded_scraper import OptimizedMultithreadedScraper, PRODUCT_FIELDS
+
+
+def test_only_skipped_urls_are_removed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    previous = ['https://isotope.com/kept-clm-1', 'https://isotope.com/gone-clm-2', 'https://isotope.com/timeout-clm-3',
+                'https://isotope.com/not-crawled-clm-4']
+    with open('previous.csv', 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=PRODUCT_FIELDS)
+        writer.writeheader()
+        for url in previous:
+            writer.writerow({'url': url, 'content_hash': 'h'})
+
+    scraper = OptimizedMultithreadedScraper(engine='static', driver_max_rss_mb=0, host_memory_limit=0)
+    scraper.output_prefix = str(tmp_path / 'nightly')
+    scraper.enable_incremental('previous.csv')
+    scraper.track_change({'url': previous[0], 'content_hash': 'h'})
+    scraper.skipped_urls.append(previous[1])
+    scraper.failed_urls.append(previous[2])
+    delta_path = scraper.close_delta()
+
+    with open(delta_path, 'r', encoding='utf-8', newline='') as f:
+        changes = {row['url']: row['change'] for row in csv.DictReader(f)}
+    assert changes == {previous[1]: 'removed', previous[2]: 'unknown'}
@@ -0,0 +1,21 @@
+import csv
+import glob
+import sys
+
+import optimized_multithreaded_scraper as scraper_module
+
+
+def test_discover_through_main(catalog_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', [
+        'optimized_multithreaded_scraper.py', '--discover', f'{catalog_server}/sitemap.xml',
+        '--engine', 'static', '-o', str(tmp_path / 'catalog'), '--no-excel', '--rate', '100',
+        '--driver-max-rss-mb', '0', '--host-memory-limit', '0',
+    ])
+    scraper_module.main()
+
+    (csv_path,) = glob.glob(str(tmp_path / 'catalog_*.csv'))
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        products = {row['product_number']: row['formula'] for row in csv.DictReader(f)}
+    # -pk 变体在发现阶段按产品编号去重
+    assert products == {'CLM-116': 'C3H7NO2', 'CDLM-4895': 'C6H12O6'}
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import optimized_multithreaded_scraper as scraper_module
+
+
+def test_async_engine_rejected_with_queue(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', [
+        'optimized_multithreaded_scraper.py', '--engine', 'async', '--queue', str(tmp_path / 'queue.db'),
+    ])
+    scraper_module.main()
+
+    assert '--engine async 不支持 --queue' in capsys.readouterr().out
+    assert not os.path.exists(tmp_path / 'queue.db')
+
+
+def test_discover_into_queue_with_local_worker(catalog_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    queue_path = str(tmp_path / 'queue.db')
+    monkeypatch.setattr(sys, 'argv', [
+        'optimized_multithreaded_scraper.py', '--discover', f'{catalog_server}/sitemap.xml', '--queue', queue_path,
+        '--engine', 'static', '-o', str(tmp_path / 'catalog'), '--no-excel', '--rate', '100',
+        '--driver-max-rss-mb', '0', '--host-memory-limit', '0',
+    ])
+    scraper_module.main()
+
+    job_queue = scraper_module.SQLiteJobQueue(queue_path)
+    assert job_queue.stats() == {'done': 2}  # -pk 变体在发现阶段已按产品编号去重
+    assert job_queue.is_drained()
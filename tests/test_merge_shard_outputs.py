@@ -0,0 +1,34 @@
+import csv
+import json
+
+from optimized_multithreaded_scraper import PRODUCT_FIELDS, merge_shard_outputs
+
+
+def write_shard_csv(path, urls):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=PRODUCT_FIELDS)
+        writer.writeheader()
+        for url in urls:
+            writer.writerow({'url': url})
+
+
+def write_journal(path, entries):
+    with open(path, 'w', encoding='utf-8') as f:
+        for url, status in entries:
+            f.write(json.dumps({'url': url, 'status': status}) + '\n')
+
+
+def test_stale_shard_csv_is_not_merged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # 上一次运行留下的分片1结果；本次分片1只有404，没有写出CSV
+    write_shard_csv('run_shard1_20260101_000000.csv', ['https://isotope.com/stale-clm-1'])
+    write_shard_csv('run_shard0_20260102_120000.csv', ['https://isotope.com/fresh-clm-2'])
+    write_journal('run_shard0.journal.jsonl', [('https://isotope.com/fresh-clm-2', 'ok')])
+    write_journal('run_shard1.journal.jsonl', [('https://isotope.com/missing-clm-3', 'skipped')])
+
+    csv_path, _ = merge_shard_outputs('run', ['run_shard0', 'run_shard1'], write_excel=False,
+                                      since='20260102_115959')
+
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        urls = [row['url'] for row in csv.DictReader(f)]
+    assert urls == ['https://isotope.com/fresh-clm-2']
@@ -0,0 +1,50 @@
+from optimized_multithreaded_scraper import parse_source_details
+
+
+def row(label, value):
+    return f'<div class="Details_row"><span class="Details_name">{label}</span><span class="Details_value">{value}</span></div>'
+
+
+def test_detail_rows():
+    page = ''.join([
+        row('CAS Number Labeled', '2206-27-1'),
+        row('CAS Number Unlabeled', '67-68-5'),
+        row('Chemical Formula', '(CD<sub>3</sub>)<sub>2</sub>SO'),
+        row('Molecular Weight', '84.17'),
+        row('Isotopic Enrichment', 'D, 99.9%'),
+        row('Synonyms', 'DMSO-d6 &amp; Methyl sulfoxide-d6'),
+        row('Chemical Purity', '99.5%'),
+    ])
+    assert parse_source_details(page) == {
+        'cas_labeled': '2206-27-1',
+        'cas_unlabeled': '67-68-5',
+        'formula': '(CD3)2SO',
+        'molecular_weight': '84.17',
+        'isotopic_enrichment': 'D, 99.9%',
+        'synonyms': 'DMSO-d6 & Methyl sulfoxide-d6',
+        'chemical_purity': '99.5%',
+    }
+
+
+def test_first_row_wins():
+    page = row('Molecular Weight', '84.17') + row('Molecular Weight', '99.99')
+    assert parse_source_details(page)['molecular_weight'] == '84.17'
+
+
+def test_heading_before_label_does_not_hide_row():
+    page = '<h2>Chemical formula</h2><div><span class="Details_name">Formula</span><span>C2D6OS</span></div>'
+    assert parse_source_details(page) == {'formula': 'C2D6OS'}
+
+
+def test_prose_before_label_does_not_hide_row():
+    page = '<p>See the formula for details</p><span>Formula</span><span>CD3OD</span>'
+    assert parse_source_details(page)['formula'] == 'CD3OD'
+
+
+def test_text_fallback():
+    page = '<p>CAS Number Unlabeled: 67-56-1 CAS Number Labeled: 811-98-3 Formula: CD3OD</p>'
+    assert parse_source_details(page) == {
+        'cas_unlabeled': '67-56-1',
+        'cas_labeled': '811-98-3',
+        'formula': 'CD3OD',
+    }
@@ -0,0 +1,19 @@
+from optimized_multithreaded_scraper import RetryScheduler
+
+
+def test_recovered_only_after_successful_retry():
+    scheduler = RetryScheduler(max_attempts=2, base_delay=0)
+    url = 'https://isotope.com/x-clm-1'
+    assert scheduler.schedule(url, 'timeout') is not None
+    scheduler.record_success(url)
+    assert scheduler.summary()['timeout'] == {'failures': 1, 'retried': 1, 'recovered': 1, 'gave_up': 0}
+
+
+def test_give_up_is_not_counted_as_recovered():
+    scheduler = RetryScheduler(max_attempts=2, base_delay=0)
+    url = 'https://isotope.com/x-clm-2'
+    scheduler.schedule(url, 'empty_extraction')
+    assert scheduler.schedule(url, 'empty_extraction') is None
+    # 放弃后空结果仍会写入结果文件，不能再计为恢复
+    scheduler.record_success(url)
+    assert scheduler.summary()['empty_extraction'] == {'failures': 2, 'retried': 1, 'recovered': 0, 'gave_up': 1}
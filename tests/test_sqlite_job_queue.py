@@ -0,0 +1,39 @@
+from optimized_multithreaded_scraper import SQLiteJobQueue
+
+
+def test_expired_lease_requeued_until_max_attempts(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / 'queue.db'), max_attempts=2)
+    queue.enqueue(['https://isotope.com/a'])
+
+    assert queue.lease('w1', -1) == {'url': 'https://isotope.com/a', 'attempts': 1}
+    assert queue.lease('w2', -1) == {'url': 'https://isotope.com/a', 'attempts': 2}
+    assert queue.lease('w3', 60) is None
+    assert queue.stats() == {'failed': 1}
+    assert queue.is_drained()
+    row = queue.connection().execute('SELECT error FROM jobs').fetchone()
+    assert row[0] == 'lease expired'
+
+
+def test_stale_worker_cannot_overwrite_new_lease(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / 'queue.db'), max_attempts=3)
+    queue.enqueue(['https://isotope.com/a'])
+
+    queue.lease('w1', -1)  # w1 的租约立即过期
+    queue.lease('w2', 60)
+    assert not queue.report('https://isotope.com/a', 'failed', 'w1', error='timeout')
+    assert queue.stats() == {'leased': 1}
+
+    assert queue.report('https://isotope.com/a', 'ok', 'w2', product={'url': 'https://isotope.com/a'})
+    assert queue.stats() == {'done': 1}
+    assert list(queue.iter_products()) == [{'url': 'https://isotope.com/a'}]
+
+
+def test_not_drained_while_producing(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / 'queue.db'))
+    assert queue.is_drained()
+
+    queue.set_producing(True)
+    assert not queue.is_drained()
+    assert queue.lease('w1', 60) is None
+    queue.set_producing(False)
+    assert queue.is_drained()
@@ -0,0 +1,17 @@
+import requests
+
+from optimized_multithreaded_scraper import StageMetrics
+
+
+def test_serve_binds_to_localhost_by_default():
+    metrics = StageMetrics()
+    metrics.observe('page_load', 0.25)
+    metrics.serve(0)
+    try:
+        host, port = metrics.server.server_address
+        assert host == '127.0.0.1'
+        response = requests.get(f'http://127.0.0.1:{port}/metrics', timeout=5)
+        assert 'page_load' in response.text
+    finally:
+        metrics.server.shutdown()
+        metrics.server.server_close()